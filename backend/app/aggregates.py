@@ -0,0 +1,104 @@
+"""
+Materialized per-participant / per-distance totals (`result_totals` table).
+
+Every write to `results` must refresh the affected (participant, distance)
+pairs inside the same transaction, so leaderboard reads scale with the
+number of participants instead of the number of shots.
+
+Rebuild from scratch (e.g. after editing a database by hand):
+
+    python -m app.aggregates CODE [CODE ...]
+    python -m app.aggregates --all
+"""
+
+import argparse
+import asyncio
+import glob
+import os
+from typing import Dict, Iterable, Optional, Tuple
+
+_TOTALS_SELECT = """
+    SELECT participant_id, distance_id, SUM(score), COUNT(id),
+           COUNT(CASE WHEN is_x=1 THEN 1 END), COUNT(CASE WHEN score=10 THEN 1 END)
+    FROM results
+"""
+
+
+async def refresh_totals(
+    conn, pairs: Iterable[Tuple[int, int]]
+) -> Dict[Tuple[int, int], Optional[Tuple[int, int, int, int]]]:
+    """Recompute totals for the given (participant_id, distance_id) pairs.
+
+    Runs on the caller's connection; the caller commits. Returns the new
+    (total, shots, x_count, ten_count) per pair, None where no shots remain.
+    """
+    pairs = list(set(pairs))
+    if not pairs:
+        return {}
+    await conn.executemany(
+        "DELETE FROM result_totals WHERE participant_id=? AND distance_id=?", pairs
+    )
+    await conn.executemany(f"""
+        INSERT INTO result_totals
+            (participant_id, distance_id, total, shots, x_count, ten_count)
+        {_TOTALS_SELECT}
+        WHERE participant_id=? AND distance_id=?
+        GROUP BY participant_id, distance_id
+    """, pairs)
+
+    pids = sorted({p for p, _ in pairs})
+    dids = sorted({d for _, d in pairs})
+    cursor = await conn.execute(f"""
+        SELECT participant_id, distance_id, total, shots, x_count, ten_count
+        FROM result_totals
+        WHERE participant_id IN ({",".join("?" * len(pids))})
+          AND distance_id    IN ({",".join("?" * len(dids))})
+    """, pids + dids)
+    found = {(r[0], r[1]): tuple(r[2:]) for r in await cursor.fetchall()}
+    return {pair: found.get(pair) for pair in pairs}
+
+
+async def delete_totals(conn, participant_id: int):
+    await conn.execute("DELETE FROM result_totals WHERE participant_id=?", (participant_id,))
+
+
+async def rebuild_totals(conn) -> int:
+    """Recompute the whole table from `results`. Returns the number of rows."""
+    await conn.execute("DELETE FROM result_totals")
+    await conn.execute(f"""
+        INSERT INTO result_totals
+            (participant_id, distance_id, total, shots, x_count, ten_count)
+        {_TOTALS_SELECT}
+        GROUP BY participant_id, distance_id
+    """)
+    cursor = await conn.execute("SELECT COUNT(*) FROM result_totals")
+    return (await cursor.fetchone())[0]
+
+
+async def _rebuild(codes):
+    from app.config import settings
+    from app.database import DatabaseManager, pool
+
+    if codes is None:
+        pattern = os.path.join(settings.DATABASE_DIR, "event_*.db")
+        codes = [os.path.basename(p)[len("event_"):-len(".db")] for p in sorted(glob.glob(pattern))]
+    for code in codes:
+        db = DatabaseManager(code)
+        if not db.exists():
+            print(f"{code}: not found")
+            continue
+        async with db.get_connection() as conn:
+            rows = await rebuild_totals(conn)
+            await conn.commit()
+        print(f"{code}: {rows} totals rebuilt")
+    await pool.close_all()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild result_totals for event databases")
+    parser.add_argument("codes", nargs="*", help="Event codes")
+    parser.add_argument("--all", action="store_true", help="Every event in DATABASE_DIR")
+    args = parser.parse_args()
+    if not args.codes and not args.all:
+        parser.error("give event codes or --all")
+    asyncio.run(_rebuild(None if args.all else [c.upper() for c in args.codes]))
@@ -0,0 +1,176 @@
+"""
+Broadcast backends for WebSocket fan-out.
+
+`ConnectionManager` hands every outgoing frame to a backend, which delivers
+it to the rooms of this process and, for multi-worker deployments, to the
+same rooms in every other worker.
+
+- `InProcessBackend` (default, WS_BUS_BACKEND=memory): local delivery only.
+- `SQLiteBackend` (WS_BUS_BACKEND=sqlite): frames are appended to a shared
+  SQLite table that each worker polls. Needs no extra service; latency is
+  about one poll interval.
+
+Besides room frames, the bus carries cache invalidations: each worker keeps
+in-memory caches (properties, sessions, leaderboard, data version), so a
+frame or notice from another worker drops that worker's caches for the
+event before anything is delivered.
+"""
+
+import asyncio
+import os
+import time
+import uuid
+from typing import Callable, Optional
+
+import aiosqlite
+
+Deliver = Callable[[str, str], None]        # (code, text frame)
+Invalidate = Callable[[str], None]          # (code)
+
+KIND_FRAME = "frame"
+KIND_INVALIDATE = "invalidate"
+
+
+class InProcessBackend:
+    """Single-process delivery."""
+
+    local_only = True
+
+    def __init__(self):
+        self.deliver: Optional[Deliver] = None
+        self.invalidate: Optional[Invalidate] = None
+
+    def attach(self, deliver: Deliver, invalidate: Invalidate):
+        self.deliver = deliver
+        self.invalidate = invalidate
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, code: str, text: str):
+        self.deliver(code, text)
+
+    async def publish_invalidation(self, code: str):
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": "memory"}
+
+
+class SQLiteBackend(InProcessBackend):
+    """Inter-process delivery through a shared SQLite notification table."""
+
+    local_only = False
+
+    def __init__(self, path: str, poll_interval: float = 0.05, retention: float = 60.0):
+        super().__init__()
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.origin = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._conn: Optional[aiosqlite.Connection] = None
+        self._task: Optional[asyncio.Task] = None
+        self._last_id = 0
+        self.published = 0
+        self.received = 0
+
+    async def start(self):
+        if self._conn is not None:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = await aiosqlite.connect(self.path, isolation_level=None)
+        await self._conn.execute("PRAGMA busy_timeout=5000")
+        await self._conn.execute("PRAGMA journal_mode=WAL")
+        await self._conn.execute("PRAGMA synchronous=NORMAL")
+        await self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS bus (
+                id      INTEGER PRIMARY KEY AUTOINCREMENT,
+                origin  TEXT NOT NULL,
+                code    TEXT NOT NULL,
+                kind    TEXT NOT NULL,
+                payload TEXT,
+                created REAL NOT NULL
+            )
+        """)
+        # Start from the current end: history is not replayed to a new worker
+        cursor = await self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM bus")
+        self._last_id = (await cursor.fetchone())[0]
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+    async def publish(self, code: str, text: str):
+        self.deliver(code, text)
+        await self._append(code, KIND_FRAME, text)
+
+    async def publish_invalidation(self, code: str):
+        await self._append(code, KIND_INVALIDATE, None)
+
+    async def poll_once(self) -> int:
+        """Deliver frames other workers appended since the last poll."""
+        if self._conn is None:
+            return 0
+        cursor = await self._conn.execute(
+            "SELECT id, origin, code, kind, payload FROM bus WHERE id > ? ORDER BY id",
+            (self._last_id,),
+        )
+        count = 0
+        for row_id, origin, code, kind, payload in await cursor.fetchall():
+            self._last_id = row_id
+            if origin == self.origin:
+                continue
+            count += 1
+            self.invalidate(code)
+            if kind == KIND_FRAME:
+                self.deliver(code, payload)
+        self.received += count
+        return count
+
+    def stats(self) -> dict:
+        return {
+            "backend": "sqlite", "path": self.path, "origin": self.origin,
+            "published": self.published, "received": self.received,
+        }
+
+    async def _append(self, code: str, kind: str, payload: Optional[str]):
+        if self._conn is None:
+            return
+        await self._conn.execute(
+            "INSERT INTO bus (origin, code, kind, payload, created) VALUES (?, ?, ?, ?, ?)",
+            (self.origin, code, kind, payload, time.time()),
+        )
+        self.published += 1
+
+    async def _loop(self):
+        last_prune = time.monotonic()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.poll_once()
+                if time.monotonic() - last_prune > self.retention:
+                    last_prune = time.monotonic()
+                    await self._conn.execute(
+                        "DELETE FROM bus WHERE created < ?", (time.time() - self.retention,)
+                    )
+            except Exception as e:
+                print(f"Broadcast bus error: {e}")
+
+
+def create_backend(settings) -> InProcessBackend:
+    if settings.WS_BUS_BACKEND == "sqlite":
+        path = settings.WS_BUS_PATH or os.path.join(settings.DATABASE_DIR, "_ws_bus.db")
+        return SQLiteBackend(path, settings.WS_BUS_POLL_INTERVAL, settings.WS_BUS_RETENTION)
+    return InProcessBackend()
@@ -1,12 +1,46 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Literal
 
 
 class Settings(BaseSettings):
     DATABASE_DIR: str = "./databases"
     ALLOWED_ORIGINS: List[str] = ["*"]
     CODE_LENGTH: int = 6
-    
+
+    # Connection pool: warm connections kept per event, and a hard cap on
+    # connections (= open file handles) across all events.
+    DB_POOL_SIZE_PER_EVENT: int = 2
+    DB_POOL_MAX_CONNECTIONS: int = 64
+
+    # SQLite storage profile, applied to every new connection.
+    # WAL lets leaderboard reads run concurrently with lane writes.
+    SQLITE_JOURNAL_MODE: Literal["DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL"] = "WAL"
+    SQLITE_SYNCHRONOUS: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = "NORMAL"
+    SQLITE_MMAP_SIZE: int = 64 * 1024 * 1024     # bytes, 0 disables memory-mapped I/O
+    SQLITE_CACHE_SIZE: int = -8000               # negative = KiB, positive = pages
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_JOURNAL_SIZE_LIMIT: int = 16 * 1024 * 1024  # WAL size kept after a checkpoint
+
+    # Background WAL checkpoint + PRAGMA optimize for recently used events (0 disables)
+    SQLITE_CHECKPOINT_INTERVAL: float = 60.0     # seconds
+
+    # WebSocket fan-out: messages buffered per connection (oldest dropped when
+    # full), and consecutive drops before a slow client is closed (0 = never).
+    WS_SEND_QUEUE_SIZE: int = 32
+    WS_MAX_DROPPED: int = 64
+
+    # Heartbeat: server pings every interval (0 disables); connections that
+    # have sent nothing (not even a pong) for the idle timeout are closed.
+    WS_HEARTBEAT_INTERVAL: float = 25.0          # seconds
+    WS_IDLE_TIMEOUT: float = 60.0                # seconds
+
+    # Cross-worker fan-out for `uvicorn --workers N`: "memory" (single process)
+    # or "sqlite" (shared notification table, polled by every worker).
+    WS_BUS_BACKEND: Literal["memory", "sqlite"] = "memory"
+    WS_BUS_PATH: str = ""                        # default: DATABASE_DIR/_ws_bus.db
+    WS_BUS_POLL_INTERVAL: float = 0.05           # seconds
+    WS_BUS_RETENTION: float = 60.0               # seconds a notification is kept
+
     class Config:
         env_file = ".env"
 
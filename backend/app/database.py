@@ -1,9 +1,16 @@
 import aiosqlite
+import asyncio
 import os
 import re
+from collections import OrderedDict
 from pathlib import Path
 from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+from fastapi import HTTPException
 from app.config import settings
+from app.event_cache import data_versions, meta_cache, session_index
+from app.leaderboard import leaderboards
+from app.migrations import has_schema, migrate
 
 # Strict allowlist: 1-16 uppercase alphanumeric characters only
 _SAFE_CODE_RE = re.compile(r'^[A-Z0-9]{1,16}$')
@@ -16,6 +23,199 @@ def _validate_code(code: str) -> str:
     return code
 
 
+# Database files already brought up to the latest schema version by this process
+_migrated: set = set()
+
+
+async def _connect(db_path: str) -> aiosqlite.Connection:
+    """Open a connection, apply the storage profile from settings and, on the
+    first open of a file in this process, run pending schema migrations."""
+    conn = await aiosqlite.connect(db_path)
+    # Values are validated by Settings (Literal / int), so formatting is safe
+    await conn.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    await conn.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+    await conn.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    await conn.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+    await conn.execute(f"PRAGMA cache_size={int(settings.SQLITE_CACHE_SIZE)}")
+    await conn.execute(f"PRAGMA journal_size_limit={int(settings.SQLITE_JOURNAL_SIZE_LIMIT)}")
+    if db_path not in _migrated and await has_schema(conn):
+        await migrate(conn)
+        _migrated.add(db_path)
+    return conn
+
+
+class ConnectionPool:
+    """Process-wide pool of warm aiosqlite connections, keyed by event code.
+
+    Up to ``per_event`` idle connections are kept per event. The total number
+    of open connections (idle + checked out) is capped at ``max_connections``;
+    when a new connection is needed and the cap is reached, the idle
+    connections of the least recently used event are closed.
+    """
+
+    def __init__(self, per_event: int, max_connections: int):
+        self.per_event = per_event
+        self.max_connections = max_connections
+        # {code: [conn, ...]} — least recently used event first
+        self._idle: "OrderedDict[str, List[aiosqlite.Connection]]" = OrderedDict()
+        # {conn: (code, generation)} for connections currently handed out
+        self._checked_out: Dict[aiosqlite.Connection, Tuple[str, int]] = {}
+        # Bumped by close_event() so stale checked-out connections get closed on release
+        self._generation: Dict[str, int] = {}
+        # {code: db_path} of events used since the last maintenance run
+        self._touched: Dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def idle_count(self) -> int:
+        return sum(len(conns) for conns in self._idle.values())
+
+    @property
+    def open_count(self) -> int:
+        return self.idle_count + len(self._checked_out)
+
+    async def acquire(self, code: str, db_path: str, touch: bool = True) -> aiosqlite.Connection:
+        if touch:
+            self._touched[code] = db_path
+        idle = self._idle.get(code)
+        if idle:
+            conn = idle.pop()
+            if not idle:
+                del self._idle[code]
+            self.hits += 1
+        else:
+            self.misses += 1
+            await self._make_room()
+            conn = await _connect(db_path)
+        self._checked_out[conn] = (code, self._generation.get(code, 0))
+        return conn
+
+    async def release(self, conn: aiosqlite.Connection):
+        code, generation = self._checked_out.pop(conn)
+        try:
+            # Never hand out a connection with a half-finished transaction
+            if conn.in_transaction:
+                await conn.rollback()
+        except Exception:
+            await self._close(conn)
+            return
+
+        idle = self._idle.setdefault(code, [])
+        self._idle.move_to_end(code)
+        if (
+            generation == self._generation.get(code, 0)
+            and len(idle) < self.per_event
+            and self.open_count < self.max_connections
+        ):
+            idle.append(conn)
+        else:
+            if not idle:
+                del self._idle[code]
+            await self._close(conn)
+
+    async def close_event(self, code: str):
+        """Close idle connections of one event; checked-out ones close on release."""
+        self._generation[code] = self._generation.get(code, 0) + 1
+        for conn in self._idle.pop(code, []):
+            await self._close(conn)
+
+    async def close_all(self):
+        for code in list(self._idle):
+            await self.close_event(code)
+        self._touched.clear()
+
+    def take_touched(self) -> Dict[str, str]:
+        """Return and reset the events used since the previous call."""
+        touched, self._touched = self._touched, {}
+        return touched
+
+    def stats(self) -> dict:
+        return {
+            "open":            self.open_count,
+            "idle":            self.idle_count,
+            "in_use":          len(self._checked_out),
+            "events":          len(self._idle),
+            "hits":            self.hits,
+            "misses":          self.misses,
+            "evictions":       self.evictions,
+            "per_event":       self.per_event,
+            "max_connections": self.max_connections,
+        }
+
+    async def _make_room(self):
+        """Evict least recently used events until one more connection fits."""
+        while self._idle and self.open_count >= self.max_connections:
+            _, conns = self._idle.popitem(last=False)
+            self.evictions += 1
+            for conn in conns:
+                await self._close(conn)
+
+    @staticmethod
+    async def _close(conn: aiosqlite.Connection):
+        try:
+            await conn.close()
+        except Exception as e:
+            print(f"Error closing pooled connection: {e}")
+
+
+pool = ConnectionPool(settings.DB_POOL_SIZE_PER_EVENT, settings.DB_POOL_MAX_CONNECTIONS)
+
+
+class MaintenanceScheduler:
+    """Background task that keeps event databases tidy during long competitions.
+
+    Every ``interval`` seconds, each event used since the previous run gets a
+    ``wal_checkpoint(TRUNCATE)`` (so the WAL file stays bounded) and a
+    ``PRAGMA optimize``.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.checkpoints = 0
+
+    def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception as e:
+                print(f"Database maintenance error: {e}")
+
+    async def run_once(self):
+        for code, db_path in pool.take_touched().items():
+            if not os.path.exists(db_path):
+                continue
+            conn = await pool.acquire(code, db_path, touch=False)
+            try:
+                if settings.SQLITE_JOURNAL_MODE == "WAL":
+                    await conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                    self.checkpoints += 1
+                await conn.execute("PRAGMA optimize")
+            finally:
+                await pool.release(conn)
+        self.runs += 1
+
+
+maintenance = MaintenanceScheduler(settings.SQLITE_CHECKPOINT_INTERVAL)
+
+
 class DatabaseManager:
     def __init__(self, code: str):
         _validate_code(code)          # hard stop — no path traversal possible
@@ -30,7 +230,14 @@ class DatabaseManager:
 
     async def init_db(self):
         """Initialize a fresh database. No event table — all event fields live in properties."""
-        async with aiosqlite.connect(self.db_path) as db:
+        # Drop pooled handles that may still point at a previous file with this name
+        await pool.close_event(self.code)
+        _migrated.discard(self.db_path)
+        meta_cache.invalidate(self.code)
+        session_index.invalidate(self.code)
+        data_versions.invalidate(self.code)
+        leaderboards.invalidate(self.code)
+        async with self.get_connection() as db:
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS properties (
                     key   TEXT PRIMARY KEY NOT NULL,
@@ -85,14 +292,47 @@ class DatabaseManager:
                 )
             """)
             await db.commit()
+            await migrate(db)
+        _migrated.add(self.db_path)
 
     def exists(self) -> bool:
         return os.path.exists(self.db_path)
 
     @asynccontextmanager
     async def get_connection(self):
-        conn = await aiosqlite.connect(self.db_path)
+        conn = await pool.acquire(self.code, self.db_path)
         try:
             yield conn
         finally:
-            await conn.close()
+            await pool.release(conn)
+
+
+# ── Request-scoped connections (FastAPI dependencies) ──────────────────────
+
+def existing_event(code: str) -> DatabaseManager:
+    """DatabaseManager for an existing event, else 404."""
+    try:
+        db = DatabaseManager(code)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Event not found")
+    if not db.exists():
+        raise HTTPException(status_code=404, detail="Event not found")
+    return db
+
+
+async def event_connection(code: str):
+    """One pooled connection per request, shared by auth checks, status checks
+    and the endpoint body. Anything left uncommitted is rolled back on exit."""
+    db = existing_event(code)
+    async with db.get_connection() as conn:
+        yield conn
+
+
+async def event_transaction(code: str):
+    """Like event_connection, but the whole request runs inside one
+    BEGIN IMMEDIATE transaction, so every read sees the state it writes to.
+    The endpoint commits; otherwise the transaction is rolled back."""
+    db = existing_event(code)
+    async with db.get_connection() as conn:
+        await conn.execute("BEGIN IMMEDIATE")
+        yield conn
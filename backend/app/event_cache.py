@@ -0,0 +1,212 @@
+import hashlib
+import secrets
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+
+class EventMeta:
+    """Snapshot of an event's properties and distance statuses."""
+
+    def __init__(self, props: Dict[str, str], distances: Dict[int, str]):
+        self.props = props            # {key: value} from the properties table
+        self.distances = distances    # {distance_id: status}
+
+
+class EventMetaCache:
+    """Per-event in-process cache of properties + distance statuses.
+
+    Hot-path checks (event status, allow-add flag, distance status) become
+    dictionary lookups. Any endpoint that changes properties or distances
+    must call invalidate() after its commit.
+    """
+
+    def __init__(self):
+        self._meta: Dict[str, EventMeta] = {}
+        # Bumped on invalidate so a load that raced with a write is not stored
+        self._generation: Dict[str, int] = {}
+
+    async def get(self, conn, code: str) -> EventMeta:
+        meta = self._meta.get(code)
+        if meta is not None:
+            return meta
+
+        generation = self._generation.get(code, 0)
+        cursor = await conn.execute("SELECT key, value FROM properties")
+        props = {r[0]: r[1] for r in await cursor.fetchall()}
+        cursor = await conn.execute("SELECT id, status FROM distances")
+        distances = {r[0]: r[1] for r in await cursor.fetchall()}
+
+        meta = EventMeta(props, distances)
+        if self._generation.get(code, 0) == generation:
+            self._meta[code] = meta
+        return meta
+
+    def invalidate(self, code: str):
+        self._generation[code] = self._generation.get(code, 0) + 1
+        self._meta.pop(code, None)
+
+
+meta_cache = EventMetaCache()
+
+
+PROP_DATA_VERSION = "data_version"
+# bump(participants=ALL_PARTICIPANTS): the write affects every participant
+ALL_PARTICIPANTS = "*"
+
+
+class DataVersions:
+    """Per-event data version, bumped by every write to results, participants,
+    distances or the event status.
+
+    The counter lives in the properties table (so it keeps increasing across
+    restarts) and is mirrored here, which lets conditional GETs answer 304
+    without touching the database. Writers call bump() inside their
+    transaction and set() after commit.
+    """
+
+    def __init__(self):
+        self._versions: Dict[str, int] = {}
+
+    def peek(self, code: str) -> Optional[int]:
+        return self._versions.get(code)
+
+    async def get(self, conn, code: str) -> int:
+        version = self._versions.get(code)
+        if version is not None:
+            return version
+        cursor = await conn.execute(
+            "SELECT value FROM properties WHERE key=?", (PROP_DATA_VERSION,)
+        )
+        row = await cursor.fetchone()
+        try:
+            version = int(row[0]) if row else 0
+        except (TypeError, ValueError):
+            version = 0
+        self.set(code, version)
+        return version
+
+    @staticmethod
+    async def bump(conn, participants: Union[Iterable[int], str, None] = None) -> int:
+        """Increment the stored version inside the caller's transaction.
+
+        `participants` (ids, or ALL_PARTICIPANTS) whose client-visible state
+        the write changed get their `rev` stamped with the new version; the
+        lane sync endpoint diffs on it.
+        """
+        cursor = await conn.execute("""
+            INSERT INTO properties (key, value) VALUES (?, '1')
+            ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1
+            RETURNING value
+        """, (PROP_DATA_VERSION,))
+        version = int((await cursor.fetchone())[0])
+        if participants == ALL_PARTICIPANTS:
+            await conn.execute("UPDATE participants SET rev=?", (version,))
+        elif participants:
+            pids = list(participants)
+            await conn.execute(
+                f"UPDATE participants SET rev=? WHERE id IN ({','.join('?' * len(pids))})",
+                [version, *pids],
+            )
+        return version
+
+    def set(self, code: str, version: int):
+        # max(): a load that read an older value must not move the mirror back
+        self._versions[code] = max(version, self._versions.get(code, 0))
+
+    def invalidate(self, code: str):
+        self._versions.pop(code, None)
+
+
+data_versions = DataVersions()
+
+
+def etag(version: int) -> str:
+    return f'W/"{version}"'
+
+
+def cache_headers(version: int) -> Dict[str, str]:
+    # no-cache: browsers keep the body but revalidate with If-None-Match every time
+    return {"ETag": etag(version), "Cache-Control": "no-cache"}
+
+
+def etag_matches(if_none_match: Optional[str], version: int) -> bool:
+    """True if an If-None-Match header covers the given version."""
+    if not if_none_match:
+        return False
+    tag = etag(version)
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate in ("*", tag, tag[2:]):
+            return True
+    return False
+
+
+def _token_key(session_id: str) -> bytes:
+    # Index by a digest rather than the raw token, so the dict lookup itself
+    # reveals nothing about how close a guessed token is to a real one
+    return hashlib.sha256(session_id.encode()).digest()
+
+
+class SessionIndex:
+    """Per-event in-process map of session token -> (role, identifier).
+
+    Loaded once from the sessions table; kept coherent by the session
+    endpoints through set() / remove() after they commit.
+    """
+
+    def __init__(self):
+        # {code: {token digest: (session_id, role, identifier)}}
+        self._index: Dict[str, Dict[bytes, Tuple[str, str, str]]] = {}
+        self._generation: Dict[str, int] = {}
+
+    async def resolve(self, conn, code: str, session_id: str) -> Optional[Tuple[str, str]]:
+        """Return (role, identifier) for a valid token, else None."""
+        index = self._index.get(code)
+        if index is None:
+            index = await self._load(conn, code)
+        entry = index.get(_token_key(session_id))
+        if entry is None:
+            return None
+        stored_sid, role, identifier = entry
+        # Full constant-time comparison of the token itself
+        if not secrets.compare_digest(stored_sid, session_id):
+            return None
+        return role, identifier
+
+    def set(self, code: str, role: str, identifier: str, session_id: str):
+        """Record the (new) token for role+identifier, replacing any old one."""
+        self._bump(code)
+        index = self._index.get(code)
+        if index is None:
+            return
+        self._drop(index, role, identifier)
+        index[_token_key(session_id)] = (session_id, role, identifier)
+
+    def remove(self, code: str, role: str, identifier: str):
+        self._bump(code)
+        index = self._index.get(code)
+        if index is not None:
+            self._drop(index, role, identifier)
+
+    def invalidate(self, code: str):
+        self._bump(code)
+        self._index.pop(code, None)
+
+    async def _load(self, conn, code: str) -> Dict[bytes, Tuple[str, str, str]]:
+        generation = self._generation.get(code, 0)
+        cursor = await conn.execute("SELECT session_id, role, identifier FROM sessions")
+        index = {_token_key(sid): (sid, role, ident) for sid, role, ident in await cursor.fetchall()}
+        if self._generation.get(code, 0) == generation:
+            self._index[code] = index
+        return index
+
+    def _bump(self, code: str):
+        self._generation[code] = self._generation.get(code, 0) + 1
+
+    @staticmethod
+    def _drop(index: Dict[bytes, Tuple[str, str, str]], role: str, identifier: str):
+        for key, (_, r, ident) in list(index.items()):
+            if r == role and ident == identifier:
+                del index[key]
+
+
+session_index = SessionIndex()
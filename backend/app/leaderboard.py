@@ -0,0 +1,262 @@
+"""
+In-memory leaderboard engine.
+
+Each event's leaderboard is loaded once from `participants`, `distances`
+and `result_totals`, then kept current by applying the refreshed totals of
+every save as a delta. Groups (`{gender}_{shooting_type}`) are kept in rank
+order in a sorted list, so reads never touch SQLite.
+
+Ranking: total score, then X count, then tens (all descending). Entries
+tied on all three share a rank ("1, 2, 2, 4").
+
+`apply_totals` returns a per-group delta (changed rows, rank moves of the
+other entries, removed entries) that save_results pushes to the event's
+WebSocket room.
+"""
+
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+
+Totals = Tuple[int, int, int, int]    # (total, shots, x_count, ten_count)
+
+
+def _score_key(row: dict) -> Tuple[int, int, int]:
+    return (-row["total_score"], -row["x_count"], -row["ten_count"])
+
+
+class EventLeaderboard:
+    """Ranked groups for one event."""
+
+    def __init__(self, distances: List[tuple], participants: Dict[int, tuple],
+                 totals: Dict[int, Dict[int, Totals]]):
+        self.distances = distances          # [(id, title, shots_count, status)] in sort order
+        self.participants = participants    # {pid: (name, lane, shift, age_cat, group_type, gender, shooting_type)}
+        self.totals = totals                # {pid: {did: Totals}}
+        self.rows: Dict[int, dict] = {}
+        # {group_key: [(-total, -x, -ten, pid), ...]} kept sorted = rank order
+        self.groups: Dict[str, List[tuple]] = {}
+        self._rendered: Optional[Dict[str, List[dict]]] = None
+        for pid in participants:
+            self._place(pid)
+
+    # ── Updates ────────────────────────────────────────────────────────────
+
+    def set_totals(self, pid: int, did: int, totals: Optional[Totals]):
+        """Apply new totals for one participant/distance (None = no shots)."""
+        if pid not in self.participants:
+            return
+        p_totals = self.totals.setdefault(pid, {})
+        if totals is None:
+            p_totals.pop(did, None)
+        else:
+            p_totals[did] = totals
+        self._unplace(pid)
+        self._place(pid)
+        self._rendered = None
+
+    def clear_participant(self, pid: int):
+        self.totals.pop(pid, None)
+        self._unplace(pid)
+        self._rendered = None
+
+    def apply(self, changes: Dict[Tuple[int, int], Optional[Totals]]) -> Dict[str, dict]:
+        """Apply several set_totals() and describe the effect per group:
+
+            {group_key: {"entries": [row + previous_rank, ...],
+                         "ranks":   [{"id", "rank"}, ...],   # other entries that moved
+                         "removed": [pid, ...]}}
+        """
+        pids = {pid for pid, _ in changes if pid in self.participants}
+        before = {gk: self._ranks(gk) for gk in {self._group_key(pid) for pid in pids}}
+        for (pid, did), totals in changes.items():
+            self.set_totals(pid, did, totals)
+
+        delta: Dict[str, dict] = {}
+        for gk, old in before.items():
+            new = self._ranks(gk)
+            entries = [
+                {**self._public(self.rows[pid], new[pid]), "previous_rank": old.get(pid)}
+                for pid in sorted(pids) if pid in new
+            ]
+            ranks = [
+                {"id": pid, "rank": rank}
+                for pid, rank in new.items() if pid not in pids and old.get(pid) != rank
+            ]
+            removed = [pid for pid in old if pid not in new]
+            if entries or ranks or removed:
+                delta[gk] = {"entries": entries, "ranks": ranks, "removed": removed}
+        return delta
+
+    # ── Reads ──────────────────────────────────────────────────────────────
+
+    def rank_of(self, pid: int) -> Optional[int]:
+        row = self.rows.get(pid)
+        if row is None:
+            return None
+        return bisect_left(self.groups[row["group_key"]], _score_key(row)) + 1
+
+    def row(self, pid: int) -> Optional[dict]:
+        row = self.rows.get(pid)
+        if row is None:
+            return None
+        return self._public(row, self.rank_of(pid))
+
+    def render(self) -> Dict[str, List[dict]]:
+        """Grouped leaderboard, each group in rank order. Cached until the next change."""
+        if self._rendered is not None:
+            return self._rendered
+        grouped: Dict[str, List[dict]] = {}
+        for group_key, keys in self.groups.items():
+            out = grouped[group_key] = []
+            prev_score, rank = None, 0
+            for i, key in enumerate(keys, start=1):
+                if key[:3] != prev_score:
+                    prev_score, rank = key[:3], i
+                out.append(self._public(self.rows[key[3]], rank))
+        self._rendered = grouped
+        return grouped
+
+    # ── Internals ──────────────────────────────────────────────────────────
+
+    def _group_key(self, pid: int) -> str:
+        p = self.participants[pid]
+        return f"{p[5]}_{p[6]}"
+
+    def _ranks(self, group_key: str) -> Dict[int, int]:
+        ranks: Dict[int, int] = {}
+        prev_score, rank = None, 0
+        for i, key in enumerate(self.groups.get(group_key, ()), start=1):
+            if key[:3] != prev_score:
+                prev_score, rank = key[:3], i
+            ranks[key[3]] = rank
+        return ranks
+
+    def _build_row(self, pid: int) -> Optional[dict]:
+        p_results = self.totals.get(pid)
+        if not p_results:
+            return None
+        name, lane, shift, age_cat, group_type, gender, shooting_type = self.participants[pid]
+
+        total_score = x_count = ten_count = shots_taken = 0
+        dist_scores = []
+        for did, title, shots_count, status in self.distances:
+            if status not in ("active", "finished"):
+                continue
+            dr = p_results.get(did)
+            if dr:
+                d_total, d_shots, d_x, d_ten = dr
+                total_score += d_total
+                x_count     += d_x
+                ten_count   += d_ten
+                shots_taken += d_shots
+                dist_scores.append({
+                    "distance_id": did, "title": title,
+                    "score": d_total, "shots_count": shots_count,
+                    "shots_taken": d_shots,
+                })
+            else:
+                dist_scores.append({
+                    "distance_id": did, "title": title,
+                    "score": None, "shots_count": shots_count,
+                    "shots_taken": 0,
+                })
+
+        return {
+            "id": pid, "name": name, "lane_shift": f"{lane}{shift}",
+            "gender": gender, "shooting_type": shooting_type,
+            "group_type": group_type, "age_category": age_cat,
+            "total_score": total_score, "x_count": x_count,
+            "ten_count": ten_count,
+            "avg_score": total_score / shots_taken if shots_taken else 0.0,
+            "distance_scores": dist_scores,
+            "group_key": self._group_key(pid),
+        }
+
+    def _place(self, pid: int):
+        row = self._build_row(pid)
+        if row is None:
+            return
+        self.rows[pid] = row
+        insort(self.groups.setdefault(row["group_key"], []), _score_key(row) + (pid,))
+
+    def _unplace(self, pid: int):
+        row = self.rows.pop(pid, None)
+        if row is None:
+            return
+        keys = self.groups[row["group_key"]]
+        del keys[bisect_left(keys, _score_key(row) + (pid,))]
+        if not keys:
+            del self.groups[row["group_key"]]
+
+    @staticmethod
+    def _public(row: dict, rank: int) -> dict:
+        out = {k: v for k, v in row.items() if k != "group_key"}
+        out["rank"] = rank
+        return out
+
+
+class LeaderboardEngine:
+    """Process-wide registry of loaded EventLeaderboards."""
+
+    def __init__(self):
+        self._boards: Dict[str, EventLeaderboard] = {}
+        # Bumped on every change so a load that raced with a write is not stored
+        self._generation: Dict[str, int] = {}
+
+    def get(self, code: str) -> Optional[EventLeaderboard]:
+        return self._boards.get(code)
+
+    async def load(self, conn, code: str) -> EventLeaderboard:
+        board = self._boards.get(code)
+        if board is not None:
+            return board
+
+        generation = self._generation.get(code, 0)
+        cursor = await conn.execute(
+            "SELECT id, title, shots_count, status FROM distances ORDER BY sort_order"
+        )
+        distances = await cursor.fetchall()
+        cursor = await conn.execute("""
+            SELECT id, name, lane_number, shift,
+                   COALESCE(age_category,'unknown'), COALESCE(group_type,'unknown'),
+                   COALESCE(gender,'unknown'),       COALESCE(shooting_type,'unknown')
+            FROM participants
+        """)
+        participants = {r[0]: tuple(r[1:]) for r in await cursor.fetchall()}
+        cursor = await conn.execute(
+            "SELECT participant_id, distance_id, total, shots, x_count, ten_count FROM result_totals"
+        )
+        totals: Dict[int, Dict[int, Totals]] = {}
+        for pid, did, total, shots, x_cnt, ten_cnt in await cursor.fetchall():
+            totals.setdefault(pid, {})[did] = (total or 0, shots or 0, x_cnt or 0, ten_cnt or 0)
+
+        board = EventLeaderboard(list(distances), participants, totals)
+        if self._generation.get(code, 0) == generation:
+            self._boards[code] = board
+        return board
+
+    def apply_totals(self, code: str, changes: Dict[Tuple[int, int], Optional[Totals]]) -> Optional[Dict[str, dict]]:
+        """Apply refreshed (pid, did) totals after a commit. Returns the
+        delta (see EventLeaderboard.apply), or None if the board is not loaded."""
+        self._bump(code)
+        board = self._boards.get(code)
+        if board is None:
+            return None
+        return board.apply(changes)
+
+    def clear_participant(self, code: str, pid: int):
+        self._bump(code)
+        board = self._boards.get(code)
+        if board is not None:
+            board.clear_participant(pid)
+
+    def invalidate(self, code: str):
+        """Drop the board; used when participants or distances change."""
+        self._bump(code)
+        self._boards.pop(code, None)
+
+    def _bump(self, code: str):
+        self._generation[code] = self._generation.get(code, 0) + 1
+
+
+leaderboards = LeaderboardEngine()
@@ -1,14 +1,29 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from app.routers import events, participants, results, websocket, distances, properties, sessions
 from app.config import settings
+from app.database import pool, maintenance
+from app.websocket_manager import manager
 import os
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    maintenance.start()
+    await manager.start()
+    yield
+    await maintenance.stop()
+    await manager.close_all()
+    await pool.close_all()
+
+
 app = FastAPI(
     title="Shooting Scoring System",
     description="Web application for managing shooting competition scores",
     version="3.0.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -27,16 +42,30 @@ app.include_router(websocket.router)
 app.include_router(properties.router)
 app.include_router(sessions.router)
 
-frontend_path = os.path.join(os.path.dirname(__file__), "../../frontend")
-if os.path.exists(frontend_path):
-    app.mount("/", StaticFiles(directory=frontend_path, html=True), name="frontend")
-
 
 @app.get("/api/health")
 async def health_check():
     return {"status": "ok", "message": "Shooting Scoring System v3"}
 
 
+@app.get("/api/health/db")
+async def db_pool_stats():
+    """Connection pool counters (open/idle/in-use connections, hits, evictions)."""
+    return pool.stats()
+
+
+@app.get("/api/health/ws")
+async def ws_stats():
+    """WebSocket rooms: connections, queued messages, drops, slow-client disconnects."""
+    return manager.stats()
+
+
+# Mounted last: a catch-all "/" mount would otherwise shadow the /api routes above
+frontend_path = os.path.join(os.path.dirname(__file__), "../../frontend")
+if os.path.exists(frontend_path):
+    app.mount("/", StaticFiles(directory=frontend_path, html=True), name="frontend")
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
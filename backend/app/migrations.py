@@ -0,0 +1,106 @@
+"""
+Versioned schema migrations for event databases.
+
+`DatabaseManager.init_db` creates the base schema (version 0). Every
+migration below is applied once, in order, in its own transaction; the
+current version is stored in the `properties` table under `schema_version`.
+Existing `event_*.db` files are upgraded the first time they are opened.
+"""
+
+from typing import List, Tuple
+
+PROP_SCHEMA_VERSION = "schema_version"
+
+# (version, description, statements)
+MIGRATIONS: List[Tuple[int, str, List[str]]] = [
+    (1, "hot-path indexes", [
+        # Leaderboard GROUP BY (participant, distance) and the per-participant
+        # state / detail queries, all answered from the index alone
+        """CREATE INDEX IF NOT EXISTS idx_results_participant_distance
+               ON results (participant_id, distance_id, shot_number, score, is_x)""",
+        # Per-distance scans (distance totals, distance detail, exports)
+        """CREATE INDEX IF NOT EXISTS idx_results_distance
+               ON results (distance_id, participant_id, shot_number, score, is_x)""",
+        # Lane lookups and the participants list ORDER BY lane_number, shift
+        """CREATE INDEX IF NOT EXISTS idx_participants_lane
+               ON participants (lane_number, shift)""",
+        # No index on distances.status: the table holds a handful of rows and
+        # a scan is as fast as an index probe (see benchmarks/bench_indexes.py)
+    ]),
+    (2, "per participant/distance aggregates", [
+        # Maintained by app.aggregates on every write to results
+        """CREATE TABLE IF NOT EXISTS result_totals (
+               participant_id INTEGER NOT NULL,
+               distance_id    INTEGER NOT NULL,
+               total          INTEGER NOT NULL DEFAULT 0,
+               shots          INTEGER NOT NULL DEFAULT 0,
+               x_count        INTEGER NOT NULL DEFAULT 0,
+               ten_count      INTEGER NOT NULL DEFAULT 0,
+               PRIMARY KEY (participant_id, distance_id)
+           ) WITHOUT ROWID""",
+        """INSERT OR REPLACE INTO result_totals
+               (participant_id, distance_id, total, shots, x_count, ten_count)
+           SELECT participant_id, distance_id, SUM(score), COUNT(id),
+                  COUNT(CASE WHEN is_x=1 THEN 1 END), COUNT(CASE WHEN score=10 THEN 1 END)
+           FROM results
+           GROUP BY participant_id, distance_id""",
+    ]),
+    (3, "lane sync", [
+        # Data version of the last write that changed a participant's state
+        # (stamped by DataVersions.bump); the lane sync diff reads it
+        "ALTER TABLE participants ADD COLUMN rev INTEGER NOT NULL DEFAULT 0",
+        # Highest operation sequence id applied per offline client, so a
+        # replayed sync batch is not applied twice
+        """CREATE TABLE IF NOT EXISTS sync_clients (
+               client_id   TEXT    PRIMARY KEY,
+               lane_number INTEGER NOT NULL,
+               last_seq    INTEGER NOT NULL DEFAULT 0
+           ) WITHOUT ROWID""",
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+async def has_schema(conn) -> bool:
+    """True once init_db has created the base tables."""
+    cursor = await conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='properties'"
+    )
+    return await cursor.fetchone() is not None
+
+
+async def get_schema_version(conn) -> int:
+    cursor = await conn.execute(
+        "SELECT value FROM properties WHERE key=?", (PROP_SCHEMA_VERSION,)
+    )
+    row = await cursor.fetchone()
+    try:
+        return int(row[0]) if row else 0
+    except (TypeError, ValueError):
+        return 0
+
+
+async def migrate(conn) -> int:
+    """Apply all pending migrations and return the resulting schema version.
+
+    Each step runs under BEGIN IMMEDIATE and re-reads the version inside the
+    transaction, so two processes opening the same file cannot apply a step twice.
+    """
+    for version, _description, statements in MIGRATIONS:
+        await conn.execute("BEGIN IMMEDIATE")
+        try:
+            if await get_schema_version(conn) >= version:
+                await conn.rollback()
+                continue
+            for stmt in statements:
+                await conn.execute(stmt)
+            await conn.execute(
+                "INSERT OR REPLACE INTO properties (key, value) VALUES (?, ?)",
+                (PROP_SCHEMA_VERSION, str(version)),
+            )
+            await conn.commit()
+        except Exception:
+            await conn.rollback()
+            raise
+    return await get_schema_version(conn)
@@ -160,3 +160,30 @@ class DistanceResult(BaseModel):
 
 class ParticipantState(BaseModel):
     distances: List[DistanceResult]
+
+
+# ── Lane sync (offline queue replay) ────────────────────────────────────────
+
+class SyncOp(ResultCreate):
+    """One queued shot, tagged with the client's sequence id."""
+    seq: int = Field(ge=1)
+
+
+class ResultSync(BaseModel):
+    client_id: str = Field(min_length=8, max_length=64)
+    lane_number: int = Field(ge=1, le=999)
+    since: Optional[int] = Field(default=None, ge=0)   # data version the client already has
+    ops: List[SyncOp] = Field(default_factory=list, max_length=5000)
+
+
+class LaneParticipantState(ParticipantState):
+    participant_id: int
+
+
+class ResultSyncResponse(BaseModel):
+    version: int
+    applied: int
+    duplicates: int
+    last_seq: int
+    participants: List[int]                 # everyone currently on the lane
+    changed: List[LaneParticipantState]     # those changed after `since`
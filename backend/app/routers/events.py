@@ -1,9 +1,12 @@
 import secrets
 import string
 from datetime import datetime, timezone
-from fastapi import APIRouter, HTTPException, Header
-from app.database import DatabaseManager
+from fastapi import APIRouter, HTTPException, Header, Depends
+from app.database import DatabaseManager, event_connection, event_transaction
+from app.event_cache import ALL_PARTICIPANTS, data_versions, meta_cache, session_index
+from app.leaderboard import leaderboards
 from app.models import EventCreate, EventUpdate, EventResponse
+from app.websocket_manager import manager
 from app.routers.sessions import require_session
 from typing import Optional
 
@@ -31,13 +34,6 @@ def _now() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
-async def _get_props(conn) -> dict:
-    """Read all properties into a dict."""
-    cursor = await conn.execute("SELECT key, value FROM properties")
-    rows = await cursor.fetchall()
-    return {r[0]: r[1] for r in rows}
-
-
 async def _set_prop(conn, key: str, value: str):
     await conn.execute(
         "INSERT OR REPLACE INTO properties (key, value) VALUES (?, ?)",
@@ -47,11 +43,10 @@ async def _set_prop(conn, key: str, value: str):
 
 # ── Helpers used by other routers ──────────────────────────────────────────
 
-async def get_event_status(db: DatabaseManager) -> str:
+async def get_event_status(conn, code: str) -> str:
     """Return current event status ('created'|'started'|'finished')."""
-    async with db.get_connection() as conn:
-        props = await _get_props(conn)
-    return props.get(PROP_STATUS, "created")
+    meta = await meta_cache.get(conn, code)
+    return meta.props.get(PROP_STATUS, "created")
 
 
 # ── Endpoints ──────────────────────────────────────────────────────────────
@@ -94,6 +89,8 @@ async def create_event(event: EventCreate):
             (new_session_id, default_password)
         )
         await conn.commit()
+    meta_cache.invalidate(event.code)
+    session_index.set(event.code, "host", "default", new_session_id)
 
     return {
         "message":       "Event created",
@@ -104,14 +101,9 @@ async def create_event(event: EventCreate):
 
 
 @router.get("/{code}", response_model=EventResponse)
-async def get_event(code: str):
+async def get_event(code: str, conn=Depends(event_connection)):
     """Get event info. Public — no auth required."""
-    db = DatabaseManager(code)
-    if not db.exists():
-        raise HTTPException(status_code=404, detail="Event not found")
-
-    async with db.get_connection() as conn:
-        props = await _get_props(conn)
+    props = (await meta_cache.get(conn, code)).props
 
     stored_code = props.get(PROP_CODE)
     if not stored_code:
@@ -132,29 +124,30 @@ async def update_event(
     code: str,
     update: EventUpdate,
     x_session_id: Optional[str] = Header(None),
+    conn=Depends(event_transaction),
 ):
     """Update event status / shots_count. Requires valid host session."""
-    db = DatabaseManager(code)
-    if not db.exists():
-        raise HTTPException(status_code=404, detail="Event not found")
-
-    await require_session(db, "host", "default", x_session_id)
-
-    async with db.get_connection() as conn:
-        if update.status:
-            await _set_prop(conn, PROP_STATUS, update.status)
-            if update.status == "started":
-                await _set_prop(conn, PROP_STARTED_AT, _now())
-            elif update.status == "finished":
-                await _set_prop(conn, PROP_FINISHED_AT, _now())
-                # Finish any active distance
-                await conn.execute(
-                    "UPDATE distances SET status='finished' WHERE status='active'"
-                )
-
-        if update.shots_count:
-            await _set_prop(conn, PROP_SHOTS, str(update.shots_count))
-
-        await conn.commit()
+    await require_session(conn, code, "host", "default", x_session_id)
+
+    if update.status:
+        await _set_prop(conn, PROP_STATUS, update.status)
+        if update.status == "started":
+            await _set_prop(conn, PROP_STARTED_AT, _now())
+        elif update.status == "finished":
+            await _set_prop(conn, PROP_FINISHED_AT, _now())
+            # Finish any active distance
+            await conn.execute(
+                "UPDATE distances SET status='finished' WHERE status='active'"
+            )
+
+    if update.shots_count:
+        await _set_prop(conn, PROP_SHOTS, str(update.shots_count))
+
+    version = await data_versions.bump(conn, ALL_PARTICIPANTS)
+    await conn.commit()
+    data_versions.set(code, version)
+    meta_cache.invalidate(code)
+    leaderboards.invalidate(code)
+    await manager.broadcast(code, {"type": "data_changed", "version": version})
 
     return {"message": "Event updated"}
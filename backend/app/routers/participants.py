@@ -1,12 +1,16 @@
 import csv
 import io
-from fastapi import APIRouter, HTTPException, Header
-from app.database import DatabaseManager
+from fastapi import APIRouter, HTTPException, Header, Depends, Response
+from app.aggregates import delete_totals
+from app.database import event_connection, event_transaction
+from app.event_cache import ALL_PARTICIPANTS, cache_headers, data_versions, etag_matches, meta_cache
+from app.leaderboard import leaderboards
 from app.models import (
     ParticipantCreate, ParticipantResponse,
     ParticipantImportRequest, ParticipantImportResult,
 )
-from app.routers.sessions import require_session, _verify_session
+from app.websocket_manager import manager
+from app.routers.sessions import require_session, resolve_session
 from app.routers.events import get_event_status
 from typing import List, Optional
 
@@ -16,12 +20,9 @@ PROP_CLIENT_ALLOW_ADD = "client_allow_add_participant"
 _MAX_BATCH = 500   # maximum participants per CSV import
 
 
-async def _get_allow_add(conn) -> bool:
-    cursor = await conn.execute(
-        "SELECT value FROM properties WHERE key=?", (PROP_CLIENT_ALLOW_ADD,)
-    )
-    row = await cursor.fetchone()
-    val = (row[0] if row else "true") or "true"
+async def _get_allow_add(conn, code: str) -> bool:
+    props = (await meta_cache.get(conn, code)).props
+    val = props.get(PROP_CLIENT_ALLOW_ADD, "true") or "true"
     return val.lower() not in ("false", "0")
 
 
@@ -30,42 +31,43 @@ async def add_participant(
     code: str,
     participant: ParticipantCreate,
     x_session_id: Optional[str] = Header(None),
+    conn=Depends(event_transaction),
 ):
     """Add one participant. Requires host, OR valid client lane session
     when client_allow_add_participant is enabled."""
-    db = DatabaseManager(code)
-    if not db.exists():
-        raise HTTPException(status_code=404, detail="Event not found")
 
     if not x_session_id:
         raise HTTPException(status_code=401, detail="Session required")
 
-    is_host   = await _verify_session(db, "host",   "default",                   x_session_id)
-    is_client = await _verify_session(db, "client", str(participant.lane_number), x_session_id)
+    owner     = await resolve_session(conn, code, x_session_id)
+    is_host   = owner == ("host",   "default")
+    is_client = owner == ("client", str(participant.lane_number))
     if not is_host and not is_client:
         raise HTTPException(status_code=401, detail="Valid session required to add participant")
 
     # Non-host clients blocked when self-registration is disabled
     if is_client and not is_host:
-        async with db.get_connection() as conn:
-            if not await _get_allow_add(conn):
-                raise HTTPException(status_code=403, detail="Self-registration is disabled by the host")
+        if not await _get_allow_add(conn, code):
+            raise HTTPException(status_code=403, detail="Self-registration is disabled by the host")
 
-    event_status = await get_event_status(db)
+    event_status = await get_event_status(conn, code)
     if event_status == "finished":
         raise HTTPException(status_code=403, detail="Event has finished and cannot be modified.")
 
-    async with db.get_connection() as conn:
-        cursor = await conn.execute("""
-            INSERT INTO participants
-                (name, lane_number, shift, gender, age_category, shooting_type, group_type, personal_number)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            participant.name, participant.lane_number, participant.shift,
-            participant.gender, participant.age_category, participant.shooting_type,
-            participant.group_type, participant.personal_number,
-        ))
-        await conn.commit()
+    cursor = await conn.execute("""
+        INSERT INTO participants
+            (name, lane_number, shift, gender, age_category, shooting_type, group_type, personal_number)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, (
+        participant.name, participant.lane_number, participant.shift,
+        participant.gender, participant.age_category, participant.shooting_type,
+        participant.group_type, participant.personal_number,
+    ))
+    version = await data_versions.bump(conn, [cursor.lastrowid])
+    await conn.commit()
+    data_versions.set(code, version)
+    leaderboards.invalidate(code)
+    await manager.broadcast(code, {"type": "data_changed", "version": version})
 
     return {"id": cursor.lastrowid, "message": "Participant added"}
 
@@ -75,6 +77,7 @@ async def import_participants_csv(
     code: str,
     body: ParticipantImportRequest,
     x_session_id: Optional[str] = Header(None),
+    conn=Depends(event_transaction),
 ):
     """Bulk import participants from CSV content. Host session required.
 
@@ -83,13 +86,9 @@ async def import_participants_csv(
 
     Returns count of added/failed rows and per-row error messages.
     """
-    db = DatabaseManager(code)
-    if not db.exists():
-        raise HTTPException(status_code=404, detail="Event not found")
-
-    await require_session(db, "host", "default", x_session_id)
+    await require_session(conn, code, "host", "default", x_session_id)
 
-    event_status = await get_event_status(db)
+    event_status = await get_event_status(conn, code)
     if event_status != "created":
         raise HTTPException(status_code=403, detail="Can only import participants before the competition starts")
 
@@ -117,68 +116,78 @@ async def import_participants_csv(
     if len(rows) > _MAX_BATCH:
         raise HTTPException(status_code=400, detail=f"Too many rows (max {_MAX_BATCH})")
 
-    async with db.get_connection() as conn:
-        for i, row in enumerate(rows, start=2):   # row 1 is header
+    for i, row in enumerate(rows, start=2):   # row 1 is header
+        try:
+            raw_name  = (row.get('name') or '').strip()
+            raw_lane  = (row.get('lane') or '').strip()
+            raw_shift = (row.get('shift') or '').strip().upper()
+
+            if not raw_name:
+                errors.append(f"Row {i}: name is required")
+                failed += 1
+                continue
+            if len(raw_name) > 120:
+                errors.append(f"Row {i}: name too long")
+                failed += 1
+                continue
+            if not raw_shift:
+                errors.append(f"Row {i}: shift is required")
+                failed += 1
+                continue
             try:
-                raw_name  = (row.get('name') or '').strip()
-                raw_lane  = (row.get('lane') or '').strip()
-                raw_shift = (row.get('shift') or '').strip().upper()
-
-                if not raw_name:
-                    errors.append(f"Row {i}: name is required")
-                    failed += 1
-                    continue
-                if len(raw_name) > 120:
-                    errors.append(f"Row {i}: name too long")
-                    failed += 1
-                    continue
-                if not raw_shift:
-                    errors.append(f"Row {i}: shift is required")
-                    failed += 1
-                    continue
-                try:
-                    lane_number = int(raw_lane)
-                    if not (1 <= lane_number <= 999):
-                        raise ValueError
-                except ValueError:
-                    errors.append(f"Row {i}: lane_number must be 1-999, got {raw_lane!r}")
-                    failed += 1
-                    continue
-
-                # Optional fields — silently truncate
-                def _opt(key: str, max_len: int = 60) -> Optional[str]:
-                    v = (row.get(key) or '').strip()[:max_len]
-                    return v or None
-
-                await conn.execute("""
-                    INSERT INTO participants
-                        (name, lane_number, shift, gender, age_category,
-                         shooting_type, group_type, personal_number)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    raw_name[:120], lane_number, raw_shift[:4],
-                    _opt('gender'), _opt('age_category'),
-                    _opt('shooting_type'), _opt('group'),
-                    _opt('personal_number', 32),
-                ))
-                added += 1
-
-            except Exception as e:
-                errors.append(f"Row {i}: {e}")
+                lane_number = int(raw_lane)
+                if not (1 <= lane_number <= 999):
+                    raise ValueError
+            except ValueError:
+                errors.append(f"Row {i}: lane_number must be 1-999, got {raw_lane!r}")
                 failed += 1
-
-        if added:
-            await conn.commit()
+                continue
+
+            # Optional fields — silently truncate
+            def _opt(key: str, max_len: int = 60) -> Optional[str]:
+                v = (row.get(key) or '').strip()[:max_len]
+                return v or None
+
+            await conn.execute("""
+                INSERT INTO participants
+                    (name, lane_number, shift, gender, age_category,
+                     shooting_type, group_type, personal_number)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                raw_name[:120], lane_number, raw_shift[:4],
+                _opt('gender'), _opt('age_category'),
+                _opt('shooting_type'), _opt('group'),
+                _opt('personal_number', 32),
+            ))
+            added += 1
+
+        except Exception as e:
+            errors.append(f"Row {i}: {e}")
+            failed += 1
+
+    if added:
+        version = await data_versions.bump(conn, ALL_PARTICIPANTS)
+        await conn.commit()
+        data_versions.set(code, version)
+        leaderboards.invalidate(code)
+        await manager.broadcast(code, {"type": "data_changed", "version": version})
 
     return ParticipantImportResult(added=added, failed=failed, errors=errors[:50])
 
 
 @router.get("/{code}", response_model=List[ParticipantResponse])
-async def get_participants(code: str, lane_number: Optional[int] = None):
+async def get_participants(
+    code: str,
+    response: Response,
+    lane_number: Optional[int] = None,
+    if_none_match: Optional[str] = Header(None),
+    conn=Depends(event_connection),
+):
     """Get participants. Public."""
-    db = DatabaseManager(code)
-    if not db.exists():
-        raise HTTPException(status_code=404, detail="Event not found")
+    version = await data_versions.get(conn, code)
+    if etag_matches(if_none_match, version):
+        return Response(status_code=304, headers=cache_headers(version))
+    response.headers.update(cache_headers(version))
 
     query  = "SELECT id, name, lane_number, shift, gender, age_category, shooting_type, group_type, personal_number FROM participants"
     params: list = []
@@ -187,9 +196,8 @@ async def get_participants(code: str, lane_number: Optional[int] = None):
         params.append(lane_number)
     query += " ORDER BY lane_number, shift"
 
-    async with db.get_connection() as conn:
-        cursor = await conn.execute(query, params)
-        rows   = await cursor.fetchall()
+    cursor = await conn.execute(query, params)
+    rows   = await cursor.fetchall()
 
     return [
         ParticipantResponse(
@@ -206,20 +214,22 @@ async def delete_participant(
     code: str,
     participant_id: int,
     x_session_id: Optional[str] = Header(None),
+    conn=Depends(event_transaction),
 ):
-    db = DatabaseManager(code)
-    if not db.exists():
-        raise HTTPException(status_code=404, detail="Event not found")
-    await require_session(db, "host", "default", x_session_id)
+    await require_session(conn, code, "host", "default", x_session_id)
 
-    event_status = await get_event_status(db)
+    event_status = await get_event_status(conn, code)
     if event_status == "finished":
         raise HTTPException(status_code=403, detail="Event has finished and cannot be modified.")
 
-    async with db.get_connection() as conn:
-        await conn.execute("DELETE FROM results WHERE participant_id=?",  (participant_id,))
-        await conn.execute("DELETE FROM participants WHERE id=?", (participant_id,))
-        await conn.commit()
+    await conn.execute("DELETE FROM results WHERE participant_id=?",  (participant_id,))
+    await delete_totals(conn, participant_id)
+    await conn.execute("DELETE FROM participants WHERE id=?", (participant_id,))
+    version = await data_versions.bump(conn)
+    await conn.commit()
+    data_versions.set(code, version)
+    leaderboards.invalidate(code)
+    await manager.broadcast(code, {"type": "data_changed", "version": version})
 
     return {"message": "Participant deleted"}
 
@@ -230,26 +240,27 @@ async def update_participant(
     participant_id: int,
     participant: ParticipantCreate,
     x_session_id: Optional[str] = Header(None),
+    conn=Depends(event_transaction),
 ):
-    db = DatabaseManager(code)
-    if not db.exists():
-        raise HTTPException(status_code=404, detail="Event not found")
-    await require_session(db, "host", "default", x_session_id)
-
-    async with db.get_connection() as conn:
-        cursor = await conn.execute("SELECT id FROM participants WHERE id=?", (participant_id,))
-        if not await cursor.fetchone():
-            raise HTTPException(status_code=404, detail="Participant not found")
-        await conn.execute("""
-            UPDATE participants
-            SET name=?, lane_number=?, shift=?, gender=?,
-                age_category=?, shooting_type=?, group_type=?, personal_number=?
-            WHERE id=?
-        """, (
-            participant.name, participant.lane_number, participant.shift, participant.gender,
-            participant.age_category, participant.shooting_type, participant.group_type,
-            participant.personal_number, participant_id,
-        ))
-        await conn.commit()
+    await require_session(conn, code, "host", "default", x_session_id)
+
+    cursor = await conn.execute("SELECT id FROM participants WHERE id=?", (participant_id,))
+    if not await cursor.fetchone():
+        raise HTTPException(status_code=404, detail="Participant not found")
+    await conn.execute("""
+        UPDATE participants
+        SET name=?, lane_number=?, shift=?, gender=?,
+            age_category=?, shooting_type=?, group_type=?, personal_number=?
+        WHERE id=?
+    """, (
+        participant.name, participant.lane_number, participant.shift, participant.gender,
+        participant.age_category, participant.shooting_type, participant.group_type,
+        participant.personal_number, participant_id,
+    ))
+    version = await data_versions.bump(conn, [participant_id])
+    await conn.commit()
+    data_versions.set(code, version)
+    leaderboards.invalidate(code)
+    await manager.broadcast(code, {"type": "data_changed", "version": version})
 
     return {"message": "Participant updated", "id": participant_id}
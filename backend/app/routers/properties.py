@@ -1,6 +1,8 @@
 from pydantic import BaseModel, Field
-from fastapi import APIRouter, HTTPException, Header
-from app.database import DatabaseManager
+from fastapi import APIRouter, HTTPException, Header, Depends
+from app.database import event_connection, event_transaction
+from app.event_cache import meta_cache
+from app.websocket_manager import manager
 from app.routers.sessions import require_session
 from typing import Optional
 
@@ -21,18 +23,15 @@ class PropertiesUpdate(BaseModel):
 
 
 @router.get("/{code}")
-async def get_properties(code: str, x_session_id: Optional[str] = Header(None)):
+async def get_properties(
+    code: str,
+    x_session_id: Optional[str] = Header(None),
+    conn=Depends(event_connection),
+):
     """Get auth/settings properties. Requires host session."""
-    db = DatabaseManager(code)
-    if not db.exists():
-        raise HTTPException(status_code=404, detail="Event not found")
-    await require_session(db, "host", "default", x_session_id)
-
-    async with db.get_connection() as conn:
-        cursor = await conn.execute("SELECT key, value FROM properties")
-        rows = await cursor.fetchall()
+    await require_session(conn, code, "host", "default", x_session_id)
 
-    props = {r[0]: r[1] for r in rows}
+    props = (await meta_cache.get(conn, code)).props
     return {
         PROP_HOST_PASSWORD:    props.get(PROP_HOST_PASSWORD, ""),
         PROP_VIEWER_PASSWORD:  props.get(PROP_VIEWER_PASSWORD, ""),
@@ -45,12 +44,10 @@ async def update_properties(
     code: str,
     data: PropertiesUpdate,
     x_session_id: Optional[str] = Header(None),
+    conn=Depends(event_transaction),
 ):
     """Update auth/settings properties. Requires host session."""
-    db = DatabaseManager(code)
-    if not db.exists():
-        raise HTTPException(status_code=404, detail="Event not found")
-    await require_session(db, "host", "default", x_session_id)
+    await require_session(conn, code, "host", "default", x_session_id)
 
     updates = {
         PROP_HOST_PASSWORD:    data.host_password,
@@ -58,31 +55,23 @@ async def update_properties(
         PROP_CLIENT_ALLOW_ADD: data.client_allow_add_participant,
     }
 
-    async with db.get_connection() as conn:
-        for key, value in updates.items():
-            if value is None:
-                continue
-            await conn.execute(
-                "INSERT OR REPLACE INTO properties (key, value) VALUES (?, ?)",
-                (key, str(value).strip()),
-            )
-        await conn.commit()
+    for key, value in updates.items():
+        if value is None:
+            continue
+        await conn.execute(
+            "INSERT OR REPLACE INTO properties (key, value) VALUES (?, ?)",
+            (key, str(value).strip()),
+        )
+    await conn.commit()
+    meta_cache.invalidate(code)
+    await manager.publish_invalidation(code)
 
     return {"message": "Properties updated"}
 
 
 @router.get("/{code}/public")
-async def get_public_properties(code: str):
+async def get_public_properties(code: str, conn=Depends(event_connection)):
     """Public: client_allow_add_participant. No auth."""
-    db = DatabaseManager(code)
-    if not db.exists():
-        raise HTTPException(status_code=404, detail="Event not found")
-
-    async with db.get_connection() as conn:
-        cursor = await conn.execute(
-            "SELECT value FROM properties WHERE key=?", (PROP_CLIENT_ALLOW_ADD,)
-        )
-        row = await cursor.fetchone()
-
-    allow_add = (row[0] if row else "true").lower() not in ("false", "0", "")
+    props = (await meta_cache.get(conn, code)).props
+    allow_add = props.get(PROP_CLIENT_ALLOW_ADD, "true").lower() not in ("false", "0", "")
     return {"client_allow_add_participant": allow_add}
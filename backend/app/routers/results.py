@@ -1,120 +1,62 @@
-from fastapi import APIRouter, HTTPException, Header
-from app.database import DatabaseManager
-from app.models import ResultCreate, ParticipantState, DistanceResult, ShotDetail
-from app.routers.sessions import require_session, _verify_session
+from fastapi import APIRouter, HTTPException, Header, Depends, Response
+from app.aggregates import refresh_totals, delete_totals
+from app.database import event_connection, event_transaction, existing_event
+from app.event_cache import cache_headers, data_versions, etag_matches, meta_cache
+from app.leaderboard import leaderboards
+from app.models import (
+    ResultCreate, ParticipantState, DistanceResult, ShotDetail,
+    ResultSync, ResultSyncResponse, LaneParticipantState,
+)
+from app.routers.sessions import require_session, resolve_session
 from app.routers.events import get_event_status
-from typing import List, Optional
+from app.websocket_manager import manager
+from typing import Dict, List, Optional, Tuple
 
 router = APIRouter(prefix="/api/results", tags=["results"])
 
 
 @router.get("/{code}/leaderboard")
-async def get_leaderboard(code: str):
-    """Leaderboard. Public."""
-    db = DatabaseManager(code)
-    if not db.exists():
-        raise HTTPException(status_code=404, detail="Event not found")
-
-    event_status = await get_event_status(db)
-
-    async with db.get_connection() as conn:
-        cursor = await conn.execute(
-            "SELECT id, title, shots_count, status FROM distances ORDER BY sort_order"
-        )
-        distances = await cursor.fetchall()
-        dist_map = {d[0]: {"title": d[1], "shots_count": d[2], "status": d[3]} for d in distances}
-
-        cursor = await conn.execute("""
-            SELECT id, name, lane_number, shift,
-                   COALESCE(age_category,'unknown'), COALESCE(group_type,'unknown'),
-                   COALESCE(gender,'unknown'),       COALESCE(shooting_type,'unknown')
-            FROM participants
-        """)
-        participants = await cursor.fetchall()
-
-        cursor = await conn.execute("""
-            SELECT r.participant_id, r.distance_id,
-                   SUM(r.score), COUNT(r.id),
-                   COUNT(CASE WHEN r.is_x=1 THEN 1 END),
-                   COUNT(CASE WHEN r.score=10 THEN 1 END)
-            FROM results r
-            GROUP BY r.participant_id, r.distance_id
-        """)
-        raw_results = await cursor.fetchall()
-
-    results_map: dict = {}
-    for pid, did, total, count, x_cnt, ten_cnt in raw_results:
-        results_map.setdefault(pid, {})[did] = {
-            "total": total or 0, "count": count or 0,
-            "x_count": x_cnt or 0, "ten_count": ten_cnt or 0,
-        }
-
-    grouped: dict = {}
-    for p in participants:
-        pid, name, lane, shift, age_cat, group_type, gender, shooting_type = p
-        p_results = results_map.get(pid, {})
-        if not p_results:
-            continue
-
-        total_score = x_count = ten_count = shots_taken = 0
-        dist_scores = []
-
-        for did, dinfo in dist_map.items():
-            dr = p_results.get(did)
-            if dinfo["status"] not in ("active", "finished"):
-                continue
-            if dr:
-                total_score  += dr["total"]
-                x_count      += dr["x_count"]
-                ten_count    += dr["ten_count"]
-                shots_taken  += dr["count"]
-                dist_scores.append({
-                    "distance_id": did, "title": dinfo["title"],
-                    "score": dr["total"], "shots_count": dinfo["shots_count"],
-                    "shots_taken": dr["count"],
-                })
-            else:
-                dist_scores.append({
-                    "distance_id": did, "title": dinfo["title"],
-                    "score": None,  "shots_count": dinfo["shots_count"],
-                    "shots_taken": 0,
-                })
-
-        avg_score = total_score / shots_taken if shots_taken else 0.0
-        group_key = f"{gender}_{shooting_type}"
-        grouped.setdefault(group_key, []).append({
-            "id": pid, "name": name, "lane_shift": f"{lane}{shift}",
-            "gender": gender, "shooting_type": shooting_type,
-            "group_type": group_type, "age_category": age_cat,
-            "total_score": total_score, "x_count": x_count,
-            "ten_count": ten_count, "avg_score": avg_score,
-            "distance_scores": dist_scores,
-        })
-
-    return grouped
+async def get_leaderboard(
+    code: str,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+):
+    """Leaderboard. Public. Served from the in-memory engine; SQLite is only
+    read the first time an event's board is needed."""
+    version = data_versions.peek(code)
+    board   = leaderboards.get(code)
+    if version is None or board is None:
+        async with existing_event(code).get_connection() as conn:
+            # Version first: the board read next can only be newer than it
+            version = await data_versions.get(conn, code)
+            board   = await leaderboards.load(conn, code)
+    if etag_matches(if_none_match, version):
+        return Response(status_code=304, headers=cache_headers(version))
+    response.headers.update(cache_headers(version))
+    return board.render()
 
 
 @router.get("/{code}/detail/{participant_id}/{distance_id}")
-async def get_distance_detail(code: str, participant_id: int, distance_id: int):
+async def get_distance_detail(
+    code: str,
+    participant_id: int,
+    distance_id: int,
+    conn=Depends(event_connection),
+):
     """Distance detail popup. Public (read-only)."""
-    db = DatabaseManager(code)
-    if not db.exists():
-        raise HTTPException(status_code=404, detail="Event not found")
-
-    async with db.get_connection() as conn:
-        cursor = await conn.execute(
-            "SELECT title, shots_count FROM distances WHERE id=?", (distance_id,)
-        )
-        dist = await cursor.fetchone()
-        if not dist:
-            raise HTTPException(status_code=404, detail="Distance not found")
-        title, shots_count = dist
-
-        cursor = await conn.execute(
-            "SELECT shot_number, score, is_x FROM results WHERE participant_id=? AND distance_id=? ORDER BY shot_number",
-            (participant_id, distance_id),
-        )
-        shots = await cursor.fetchall()
+    cursor = await conn.execute(
+        "SELECT title, shots_count FROM distances WHERE id=?", (distance_id,)
+    )
+    dist = await cursor.fetchone()
+    if not dist:
+        raise HTTPException(status_code=404, detail="Distance not found")
+    title, shots_count = dist
+
+    cursor = await conn.execute(
+        "SELECT shot_number, score, is_x FROM results WHERE participant_id=? AND distance_id=? ORDER BY shot_number",
+        (participant_id, distance_id),
+    )
+    shots = await cursor.fetchall()
 
     shots_per_series = 3
     shots_map   = {s[0]: {"score": s[1], "is_x": bool(s[2])} for s in shots}
@@ -152,42 +94,131 @@ async def get_distance_detail(code: str, participant_id: int, distance_id: int):
 
 
 @router.get("/{code}/state/{participant_id}", response_model=ParticipantState)
-async def get_participant_state(code: str, participant_id: int):
+async def get_participant_state(
+    code: str,
+    participant_id: int,
+    conn=Depends(event_connection),
+):
     """Full state for client restore. Public."""
-    db = DatabaseManager(code)
-    if not db.exists():
-        raise HTTPException(status_code=404, detail="Event not found")
-
-    async with db.get_connection() as conn:
-        cursor = await conn.execute(
-            "SELECT id, title, shots_count, status FROM distances ORDER BY sort_order"
-        )
-        distances = await cursor.fetchall()
-
-        cursor = await conn.execute(
-            "SELECT distance_id, shot_number, score, is_x FROM results WHERE participant_id=? ORDER BY distance_id, shot_number",
-            (participant_id,),
-        )
-        all_shots = await cursor.fetchall()
+    return (await load_participant_states(conn, [participant_id]))[participant_id]
+
+
+async def load_participant_states(conn, pids: List[int]) -> Dict[int, ParticipantState]:
+    """Client restore state for several participants: two queries in total.
+    Shots of finished distances are left out (only their totals are shown)."""
+    cursor = await conn.execute(
+        "SELECT id, title, shots_count, status FROM distances ORDER BY sort_order"
+    )
+    distances = await cursor.fetchall()
 
     shots_by_dist: dict = {}
-    for did, shot_num, score, is_x in all_shots:
-        shots_by_dist.setdefault(did, []).append(
-            ShotDetail(shot=shot_num, score=score, is_x=bool(is_x))
-        )
+    if pids:
+        cursor = await conn.execute(f"""
+            SELECT participant_id, distance_id, shot_number, score, is_x FROM results
+            WHERE participant_id IN ({','.join('?' * len(pids))})
+            ORDER BY participant_id, distance_id, shot_number
+        """, list(pids))
+        for pid, did, shot_num, score, is_x in await cursor.fetchall():
+            shots_by_dist.setdefault((pid, did), []).append(
+                ShotDetail(shot=shot_num, score=score, is_x=bool(is_x))
+            )
+
+    states = {}
+    for pid in pids:
+        dist_results = []
+        for did, title, shots_count, status in distances:
+            shots  = shots_by_dist.get((pid, did), [])
+            total  = sum(s.score for s in shots) if shots else None
+            x_count = sum(1 for s in shots if s.is_x)
+            dist_results.append(DistanceResult(
+                distance_id=did, title=title, shots_count=shots_count, status=status,
+                total_score=total, x_count=x_count,
+                shots=[] if status == "finished" else shots,
+            ))
+        states[pid] = ParticipantState(distances=dist_results)
+    return states
+
+
+async def store_results(conn, code: str, results: List[ResultCreate], session_id: Optional[str]) -> int:
+    """Validate, persist and publish a batch of shots; shared by POST /results
+    and the WebSocket `submit_shots` message. `conn` must be inside BEGIN
+    IMMEDIATE. Raises HTTPException; returns the new data version."""
+    if not session_id:
+        raise HTTPException(status_code=401, detail="Session ID required")
+
+    await _require_started(conn, code)
+
+    for r in results:
+        if r.score < 0 or r.score > 10:
+            raise HTTPException(status_code=400, detail="Score must be 0-10")
 
-    dist_results = []
-    for did, title, shots_count, status in distances:
-        shots  = shots_by_dist.get(did, [])
-        total  = sum(s.score for s in shots) if shots else None
-        x_count = sum(1 for s in shots if s.is_x)
-        dist_results.append(DistanceResult(
-            distance_id=did, title=title, shots_count=shots_count, status=status,
-            total_score=total, x_count=x_count,
-            shots=[] if status == "finished" else shots,
-        ))
+    owner = await resolve_session(conn, code, session_id)
+    if owner is None:
+        raise HTTPException(status_code=401, detail="Invalid session")
+    if not results:
+        return await data_versions.get(conn, code)
 
-    return ParticipantState(distances=dist_results)
+    pids, totals = await _write_shots(conn, code, results, owner)
+    version = await data_versions.bump(conn, pids)
+    await conn.commit()
+    data_versions.set(code, version)
+    await _publish_totals(code, version, totals)
+    return version
+
+
+async def _require_started(conn, code: str):
+    event_status = await get_event_status(conn, code)
+    if event_status == "finished":
+        raise HTTPException(status_code=403, detail="Event has finished")
+    if event_status != "started":
+        raise HTTPException(status_code=403, detail="Event has not started yet")
+
+
+async def _write_shots(conn, code: str, results: List[ResultCreate], owner: Tuple[str, str]):
+    """Check a non-empty batch against `owner` and the distance statuses, then
+    write it and refresh the aggregates. Returns (participant ids, totals)."""
+    # Every participant in the batch must exist and, for a lane session,
+    # belong to that lane — one query for the whole batch
+    pids = sorted({r.participant_id for r in results})
+    cursor = await conn.execute(
+        f"SELECT id, lane_number FROM participants WHERE id IN ({','.join('?' * len(pids))})", pids
+    )
+    lanes = {pid: lane for pid, lane in await cursor.fetchall()}
+    for pid in pids:
+        if pid not in lanes:
+            raise HTTPException(status_code=404, detail=f"Participant {pid} not found")
+        if owner not in (("client", str(lanes[pid])), ("host", "default")):
+            raise HTTPException(status_code=401, detail="Invalid session")
+
+    # Distance statuses come from the in-memory meta cache (no query)
+    dist_status = (await meta_cache.get(conn, code)).distances
+    for did in {r.distance_id for r in results}:
+        if did not in dist_status:
+            raise HTTPException(status_code=404, detail=f"Distance {did} not found")
+        if dist_status[did] != "active":
+            raise HTTPException(status_code=403, detail=f"Distance {did} is not active")
+
+    # Make sure the in-memory board exists (as of before this write), so the
+    # post-commit update below yields a delta with correct previous ranks
+    await leaderboards.load(conn, code)
+
+    await conn.executemany("""
+        INSERT OR REPLACE INTO results
+            (participant_id, distance_id, shot_number, score, is_x)
+        VALUES (?, ?, ?, ?, ?)
+    """, [(r.participant_id, r.distance_id, r.shot_number, r.score, r.is_x) for r in results])
+
+    totals = await refresh_totals(conn, ((r.participant_id, r.distance_id) for r in results))
+    return pids, totals
+
+
+async def _publish_totals(code: str, version: int, totals):
+    """After commit: update the in-memory leaderboard and push the delta."""
+    delta = leaderboards.apply_totals(code, totals)
+    if delta is None:
+        await manager.broadcast(code, {"type": "data_changed", "version": version})
+    else:
+        await manager.broadcast(code, {"type": "leaderboard_delta", "version": version, "groups": delta})
 
 
 @router.post("/{code}")
@@ -195,58 +226,74 @@ async def save_results(
     code: str,
     results: List[ResultCreate],
     x_session_id: Optional[str] = Header(None),
+    conn=Depends(event_transaction),
 ):
     """Save shots. Requires valid client lane OR host session."""
-    db = DatabaseManager(code)
-    if not db.exists():
-        raise HTTPException(status_code=404, detail="Event not found")
+    await store_results(conn, code, results, x_session_id)
+    return {"message": "Results saved", "count": len(results)}
+
 
+@router.post("/{code}/sync", response_model=ResultSyncResponse)
+async def sync_results(
+    code: str,
+    batch: ResultSync,
+    x_session_id: Optional[str] = Header(None),
+    conn=Depends(event_transaction),
+):
+    """Replay a lane client's offline queue. Requires the lane's session (or host).
+
+    Ops carry client sequence ids: ops at or below the highest id already
+    applied for `client_id` are skipped, so a batch can be resent any number
+    of times. New ops are applied in sequence order in one transaction. The
+    response lists the lane's participants and the full state of those
+    changed after `since` (all of them when `since` is omitted).
+    """
     if not x_session_id:
         raise HTTPException(status_code=401, detail="Session ID required")
-
-    event_status = await get_event_status(db)
-    if event_status == "finished":
-        raise HTTPException(status_code=403, detail="Event has finished")
-    if event_status != "started":
-        raise HTTPException(status_code=403, detail="Event has not started yet")
-
-    if results:
-        async with db.get_connection() as conn:
-            cursor = await conn.execute(
-                "SELECT lane_number FROM participants WHERE id=?", (results[0].participant_id,)
-            )
-            p_row = await cursor.fetchone()
-
-        if p_row:
-            lane_str = str(p_row[0])
-            ok = await _verify_session(db, "client", lane_str, x_session_id)
-            if not ok:
-                ok = await _verify_session(db, "host", "default", x_session_id)
-            if not ok:
-                raise HTTPException(status_code=401, detail="Invalid session")
-
-    async with db.get_connection() as conn:
-        dist_ids = {r.distance_id for r in results}
-        for did in dist_ids:
-            cursor = await conn.execute("SELECT status FROM distances WHERE id=?", (did,))
-            row = await cursor.fetchone()
-            if not row:
-                raise HTTPException(status_code=404, detail=f"Distance {did} not found")
-            if row[0] != "active":
-                raise HTTPException(status_code=403, detail=f"Distance {did} is not active")
-
-        for r in results:
-            if r.score < 0 or r.score > 10:
-                raise HTTPException(status_code=400, detail="Score must be 0-10")
-            await conn.execute("""
-                INSERT OR REPLACE INTO results
-                    (participant_id, distance_id, shot_number, score, is_x)
-                VALUES (?, ?, ?, ?, ?)
-            """, (r.participant_id, r.distance_id, r.shot_number, r.score, r.is_x))
-
+    owner = await resolve_session(conn, code, x_session_id)
+    if owner not in (("client", str(batch.lane_number)), ("host", "default")):
+        raise HTTPException(status_code=401, detail="Invalid session")
+
+    cursor = await conn.execute(
+        "SELECT last_seq FROM sync_clients WHERE client_id=?", (batch.client_id,)
+    )
+    row = await cursor.fetchone()
+    last_seq = row[0] if row else 0
+    fresh = sorted((op for op in batch.ops if op.seq > last_seq), key=lambda op: op.seq)
+
+    if fresh:
+        await _require_started(conn, code)
+        pids, totals = await _write_shots(conn, code, fresh, owner)
+        last_seq = fresh[-1].seq
+        await conn.execute("""
+            INSERT INTO sync_clients (client_id, lane_number, last_seq) VALUES (?, ?, ?)
+            ON CONFLICT(client_id) DO UPDATE
+                SET lane_number=excluded.lane_number, last_seq=excluded.last_seq
+        """, (batch.client_id, batch.lane_number, last_seq))
+        version = await data_versions.bump(conn, pids)
         await conn.commit()
-
-    return {"message": "Results saved", "count": len(results)}
+        data_versions.set(code, version)
+        await _publish_totals(code, version, totals)
+    else:
+        await conn.rollback()        # pure replay: release the write lock
+        version = await data_versions.get(conn, code)
+
+    # Version is read before the state, so the diff may repeat a later
+    # change on the next sync but never misses one
+    cursor = await conn.execute(
+        "SELECT id, rev FROM participants WHERE lane_number=? ORDER BY shift",
+        (batch.lane_number,),
+    )
+    lane = await cursor.fetchall()
+    changed = [pid for pid, rev in lane if batch.since is None or rev > batch.since]
+    states = await load_participant_states(conn, changed)
+
+    return ResultSyncResponse(
+        version=version, applied=len(fresh), duplicates=len(batch.ops) - len(fresh),
+        last_seq=last_seq, participants=[pid for pid, _ in lane],
+        changed=[LaneParticipantState(participant_id=pid, distances=states[pid].distances)
+                 for pid in changed],
+    )
 
 
 @router.delete("/{code}/{participant_id}")
@@ -254,14 +301,16 @@ async def delete_participant_results(
     code: str,
     participant_id: int,
     x_session_id: Optional[str] = Header(None),
+    conn=Depends(event_transaction),
 ):
-    db = DatabaseManager(code)
-    if not db.exists():
-        raise HTTPException(status_code=404, detail="Event not found")
-    await require_session(db, "host", "default", x_session_id)
-
-    async with db.get_connection() as conn:
-        await conn.execute("DELETE FROM results WHERE participant_id=?", (participant_id,))
-        await conn.commit()
+    await require_session(conn, code, "host", "default", x_session_id)
+
+    await conn.execute("DELETE FROM results WHERE participant_id=?", (participant_id,))
+    await delete_totals(conn, participant_id)
+    version = await data_versions.bump(conn, [participant_id])
+    await conn.commit()
+    data_versions.set(code, version)
+    leaderboards.clear_participant(code, participant_id)
+    await manager.broadcast(code, {"type": "data_changed", "version": version})
 
     return {"message": "Results deleted"}
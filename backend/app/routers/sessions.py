@@ -1,9 +1,11 @@
 import secrets
 import string
 from pydantic import BaseModel, Field
-from fastapi import APIRouter, HTTPException, Header
-from app.database import DatabaseManager
-from typing import Optional
+from fastapi import APIRouter, HTTPException, Header, Depends
+from app.database import event_connection, event_transaction
+from app.event_cache import session_index
+from app.websocket_manager import manager
+from typing import Optional, Tuple
 
 router = APIRouter(prefix="/api/sessions", tags=["sessions"])
 
@@ -34,67 +36,66 @@ class LaneLoginRequest(BaseModel):
 
 # ── Helpers ────────────────────────────────────────────────────────────────
 
-async def _verify_session(db: DatabaseManager, role: str, identifier: str, session_id: str) -> bool:
+async def resolve_session(conn, code: str, session_id: Optional[str]) -> Optional[Tuple[str, str]]:
+    """Return (role, identifier) owning session_id, or None.
+
+    One in-memory lookup (see event_cache.SessionIndex); the token itself is
+    still checked with secrets.compare_digest to prevent timing attacks.
+    """
+    if not session_id:
+        return None
+    return await session_index.resolve(conn, code, session_id)
+
+
+async def _verify_session(conn, code: str, role: str, identifier: str, session_id: str) -> bool:
     """Constant-time-safe session check (compare full token)."""
-    async with db.get_connection() as conn:
-        cursor = await conn.execute(
-            "SELECT session_id FROM sessions WHERE role=? AND identifier=?",
-            (role, identifier),
-        )
-        row = await cursor.fetchone()
-    if row is None:
-        return False
-    # Use secrets.compare_digest to prevent timing attacks
-    return secrets.compare_digest(row[0], session_id)
+    return await resolve_session(conn, code, session_id) == (role, identifier)
 
 
-async def require_session(db: DatabaseManager, role: str, identifier: str, session_id: Optional[str]):
+async def require_session(conn, code: str, role: str, identifier: str, session_id: Optional[str]):
     if not session_id:
         raise HTTPException(status_code=401, detail="Session ID required")
-    if not await _verify_session(db, role, identifier, session_id):
+    if not await _verify_session(conn, code, role, identifier, session_id):
         raise HTTPException(status_code=401, detail="Invalid or expired session")
 
 
 # ── Host ───────────────────────────────────────────────────────────────────
 
 @router.post("/{code}/host")
-async def host_login(code: str, req: LoginRequest):
-    db = DatabaseManager(code)
-    if not db.exists():
-        raise HTTPException(status_code=404, detail="Event not found")
-
-    async with db.get_connection() as conn:
-        cursor = await conn.execute("SELECT value FROM properties WHERE key='host_password'")
-        row = await cursor.fetchone()
-        stored_pw = (row[0] if row else "") or ""
-
-        cursor = await conn.execute(
-            "SELECT session_id FROM sessions WHERE role='host' AND identifier='default'"
+async def host_login(code: str, req: LoginRequest, conn=Depends(event_transaction)):
+    cursor = await conn.execute("SELECT value FROM properties WHERE key='host_password'")
+    row = await cursor.fetchone()
+    stored_pw = (row[0] if row else "") or ""
+
+    cursor = await conn.execute(
+        "SELECT session_id FROM sessions WHERE role='host' AND identifier='default'"
+    )
+    sess_row = await cursor.fetchone()
+
+    # Auto-login with saved session_id (timing-safe)
+    if sess_row and req.session_id:
+        if secrets.compare_digest(sess_row[0], req.session_id):
+            return {"ok": True, "session_id": sess_row[0]}
+
+    # Password verification (timing-safe, constant-time even when stored_pw is empty)
+    if stored_pw:
+        if not secrets.compare_digest(stored_pw, req.password):
+            raise HTTPException(status_code=401, detail="Invalid admin password")
+
+    new_sid = _gen_session_id()
+    if sess_row:
+        await conn.execute(
+            "UPDATE sessions SET session_id=? WHERE role='host' AND identifier='default'",
+            (new_sid,),
         )
-        sess_row = await cursor.fetchone()
-
-        # Auto-login with saved session_id (timing-safe)
-        if sess_row and req.session_id:
-            if secrets.compare_digest(sess_row[0], req.session_id):
-                return {"ok": True, "session_id": sess_row[0]}
-
-        # Password verification (timing-safe, constant-time even when stored_pw is empty)
-        if stored_pw:
-            if not secrets.compare_digest(stored_pw, req.password):
-                raise HTTPException(status_code=401, detail="Invalid admin password")
-
-        new_sid = _gen_session_id()
-        if sess_row:
-            await conn.execute(
-                "UPDATE sessions SET session_id=? WHERE role='host' AND identifier='default'",
-                (new_sid,),
-            )
-        else:
-            await conn.execute(
-                "INSERT INTO sessions (role, identifier, session_id, password) VALUES ('host','default',?,?)",
-                (new_sid, stored_pw or ""),
-            )
-        await conn.commit()
+    else:
+        await conn.execute(
+            "INSERT INTO sessions (role, identifier, session_id, password) VALUES ('host','default',?,?)",
+            (new_sid, stored_pw or ""),
+        )
+    await conn.commit()
+    session_index.set(code, "host", "default", new_sid)
+    await manager.publish_invalidation(code)
 
     return {"ok": True, "session_id": new_sid}
 
@@ -102,41 +103,38 @@ async def host_login(code: str, req: LoginRequest):
 # ── Viewer ─────────────────────────────────────────────────────────────────
 
 @router.post("/{code}/viewer")
-async def viewer_login(code: str, req: LoginRequest):
-    db = DatabaseManager(code)
-    if not db.exists():
-        raise HTTPException(status_code=404, detail="Event not found")
-
-    async with db.get_connection() as conn:
-        cursor = await conn.execute("SELECT value FROM properties WHERE key='viewer_password'")
-        row = await cursor.fetchone()
-        stored_pw = (row[0] if row else "") or ""
-
-        cursor = await conn.execute(
-            "SELECT session_id FROM sessions WHERE role='viewer' AND identifier='default'"
+async def viewer_login(code: str, req: LoginRequest, conn=Depends(event_transaction)):
+    cursor = await conn.execute("SELECT value FROM properties WHERE key='viewer_password'")
+    row = await cursor.fetchone()
+    stored_pw = (row[0] if row else "") or ""
+
+    cursor = await conn.execute(
+        "SELECT session_id FROM sessions WHERE role='viewer' AND identifier='default'"
+    )
+    sess_row = await cursor.fetchone()
+
+    if sess_row and req.session_id:
+        if secrets.compare_digest(sess_row[0], req.session_id):
+            return {"ok": True, "session_id": sess_row[0]}
+
+    if stored_pw:
+        if not secrets.compare_digest(stored_pw, req.password):
+            raise HTTPException(status_code=401, detail="Invalid viewer password")
+
+    new_sid = _gen_session_id()
+    if sess_row:
+        await conn.execute(
+            "UPDATE sessions SET session_id=? WHERE role='viewer' AND identifier='default'",
+            (new_sid,),
         )
-        sess_row = await cursor.fetchone()
-
-        if sess_row and req.session_id:
-            if secrets.compare_digest(sess_row[0], req.session_id):
-                return {"ok": True, "session_id": sess_row[0]}
-
-        if stored_pw:
-            if not secrets.compare_digest(stored_pw, req.password):
-                raise HTTPException(status_code=401, detail="Invalid viewer password")
-
-        new_sid = _gen_session_id()
-        if sess_row:
-            await conn.execute(
-                "UPDATE sessions SET session_id=? WHERE role='viewer' AND identifier='default'",
-                (new_sid,),
-            )
-        else:
-            await conn.execute(
-                "INSERT INTO sessions (role, identifier, session_id, password) VALUES ('viewer','default',?,?)",
-                (new_sid, stored_pw or ""),
-            )
-        await conn.commit()
+    else:
+        await conn.execute(
+            "INSERT INTO sessions (role, identifier, session_id, password) VALUES ('viewer','default',?,?)",
+            (new_sid, stored_pw or ""),
+        )
+    await conn.commit()
+    session_index.set(code, "viewer", "default", new_sid)
+    await manager.publish_invalidation(code)
 
     return {"ok": True, "has_password": bool(stored_pw), "session_id": new_sid}
 
@@ -144,62 +142,64 @@ async def viewer_login(code: str, req: LoginRequest):
 # ── Client lane ────────────────────────────────────────────────────────────
 
 @router.post("/{code}/lane/{lane_number}")
-async def get_or_create_lane_session(code: str, lane_number: int, req: LaneLoginRequest = None):
+async def get_or_create_lane_session(
+    code: str,
+    lane_number: int,
+    req: LaneLoginRequest = None,
+    conn=Depends(event_transaction),
+):
     if req is None:
         req = LaneLoginRequest()
 
-    db = DatabaseManager(code)
-    if not db.exists():
-        raise HTTPException(status_code=404, detail="Event not found")
-
     identifier = str(lane_number)
 
-    async with db.get_connection() as conn:
-        cursor = await conn.execute(
-            "SELECT session_id, password FROM sessions WHERE role='client' AND identifier=?",
-            (identifier,),
+    cursor = await conn.execute(
+        "SELECT session_id, password FROM sessions WHERE role='client' AND identifier=?",
+        (identifier,),
+    )
+    row = await cursor.fetchone()
+
+    if row is None:
+        new_pw  = _gen_password()
+        new_sid = _gen_session_id()
+        await conn.execute(
+            "INSERT INTO sessions (role, identifier, session_id, password) VALUES ('client',?,?,?)",
+            (identifier, new_sid, new_pw),
         )
-        row = await cursor.fetchone()
+        await conn.commit()
+        session_index.set(code, "client", identifier, new_sid)
+        await manager.publish_invalidation(code)
+        return {"status": "created", "session_id": new_sid, "password": new_pw, "lane_number": lane_number}
 
-        if row is None:
-            new_pw  = _gen_password()
-            new_sid = _gen_session_id()
-            await conn.execute(
-                "INSERT INTO sessions (role, identifier, session_id, password) VALUES ('client',?,?,?)",
-                (identifier, new_sid, new_pw),
-            )
-            await conn.commit()
-            return {"status": "created", "session_id": new_sid, "password": new_pw, "lane_number": lane_number}
+    stored_sid, stored_pw = row
 
-        stored_sid, stored_pw = row
+    if req.session_id and secrets.compare_digest(stored_sid, req.session_id):
+        return {"status": "ok", "session_id": stored_sid, "lane_number": lane_number}
 
-        if req.session_id and secrets.compare_digest(stored_sid, req.session_id):
-            return {"status": "ok", "session_id": stored_sid, "lane_number": lane_number}
+    if not req.password:
+        return {"status": "password_required", "lane_number": lane_number}
 
-        if not req.password:
-            return {"status": "password_required", "lane_number": lane_number}
+    if not secrets.compare_digest(stored_pw, req.password.upper()):
+        raise HTTPException(status_code=401, detail="Invalid lane password")
 
-        if not secrets.compare_digest(stored_pw, req.password.upper()):
-            raise HTTPException(status_code=401, detail="Invalid lane password")
-
-        return {"status": "ok", "session_id": stored_sid, "lane_number": lane_number}
+    return {"status": "ok", "session_id": stored_sid, "lane_number": lane_number}
 
 
 # ── Host: list lane sessions ───────────────────────────────────────────────
 
 @router.get("/{code}/lanes")
-async def list_lane_sessions(code: str, x_session_id: Optional[str] = Header(None)):
+async def list_lane_sessions(
+    code: str,
+    x_session_id: Optional[str] = Header(None),
+    conn=Depends(event_connection),
+):
     """Return lane numbers with active sessions. Requires host session."""
-    db = DatabaseManager(code)
-    if not db.exists():
-        raise HTTPException(status_code=404, detail="Event not found")
-    await require_session(db, "host", "default", x_session_id)
-
-    async with db.get_connection() as conn:
-        cursor = await conn.execute(
-            "SELECT identifier FROM sessions WHERE role='client' ORDER BY CAST(identifier AS INTEGER)"
-        )
-        rows = await cursor.fetchall()
+    await require_session(conn, code, "host", "default", x_session_id)
+
+    cursor = await conn.execute(
+        "SELECT identifier FROM sessions WHERE role='client' ORDER BY CAST(identifier AS INTEGER)"
+    )
+    rows = await cursor.fetchall()
 
     return {"lanes": [int(r[0]) for r in rows]}
 
@@ -211,16 +211,15 @@ async def reset_lane_session(
     code: str,
     lane_number: int,
     x_session_id: Optional[str] = Header(None),
+    conn=Depends(event_transaction),
 ):
-    db = DatabaseManager(code)
-    if not db.exists():
-        raise HTTPException(status_code=404, detail="Event not found")
-    await require_session(db, "host", "default", x_session_id)
-
-    async with db.get_connection() as conn:
-        await conn.execute(
-            "DELETE FROM sessions WHERE role='client' AND identifier=?", (str(lane_number),)
-        )
-        await conn.commit()
+    await require_session(conn, code, "host", "default", x_session_id)
+
+    await conn.execute(
+        "DELETE FROM sessions WHERE role='client' AND identifier=?", (str(lane_number),)
+    )
+    await conn.commit()
+    session_index.remove(code, "client", str(lane_number))
+    await manager.publish_invalidation(code)
 
     return {"message": f"Session for lane {lane_number} reset"}
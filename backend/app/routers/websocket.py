@@ -1,18 +1,48 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
+from app.database import existing_event
+from app.models import ResultCreate
+from app.routers.results import store_results
 from app.websocket_manager import manager
 
 router = APIRouter()
 
 
+async def _submit_shots(websocket: WebSocket, code: str, data: dict):
+    """Save a batch of shots sent over the socket and ack it to the sender.
+
+    Same auth, validation and persistence as POST /api/results/{code}; the
+    session token travels in the message since browsers cannot set headers
+    on a WebSocket. `seq` is the event data version the batch produced.
+    """
+    ack = {"type": "shots_ack", "batch_id": data.get("batch_id")}
+    try:
+        results = [ResultCreate(**r) for r in data.get("results") or []]
+        async with existing_event(code).get_connection() as conn:
+            await conn.execute("BEGIN IMMEDIATE")
+            version = await store_results(conn, code, results, data.get("session_id"))
+        ack.update(ok=True, seq=version, count=len(results))
+    except HTTPException as e:
+        ack.update(ok=False, status=e.status_code, detail=e.detail)
+    except (TypeError, ValidationError):
+        ack.update(ok=False, status=422, detail="Invalid results")
+    manager.send(websocket, code, ack)
+
+
 @router.websocket("/ws/{code}")
 async def websocket_endpoint(websocket: WebSocket, code: str):
     await manager.connect(websocket, code)
     try:
         while True:
             data = await websocket.receive_json()
+            manager.touch(websocket, code)
             msg_type = data.get("type")
 
-            if msg_type == "result_update":
+            if msg_type == "pong":
+                continue
+            elif msg_type == "submit_shots":
+                await _submit_shots(websocket, code, data)
+            elif msg_type == "result_update":
                 await manager.broadcast(code, {
                     "type": "result_update",
                     "participant_id": data.get("participant_id"),
@@ -1,42 +1,262 @@
+import asyncio
+import json
+import time
+from collections import deque
 from fastapi import WebSocket
-from typing import Dict, List
+from typing import Deque, Dict, Optional, Set
+from app.broadcast_bus import InProcessBackend, create_backend
+from app.config import settings
+from app.event_cache import data_versions, meta_cache, session_index
+from app.leaderboard import leaderboards
+
+try:                      # optional, faster encoder
+    import orjson
+except ImportError:       # pragma: no cover
+    orjson = None
+
+# Close code for connections dropped by the slow-consumer policy
+# ("Try Again Later"): clients reconnect and resync.
+CLOSE_SLOW_CONSUMER = 1013
+# Close code for connections reaped by the heartbeat ("Going Away")
+CLOSE_IDLE = 1001
+
+
+def encode(message: dict) -> str:
+    """JSON text frame for a message; same output shape as send_json()."""
+    if orjson is not None:
+        return orjson.dumps(message).decode()
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+
+_PING = encode({"type": "ping"})
+
+
+class _Peer:
+    """One room member: a bounded outgoing queue drained by its own task."""
+
+    def __init__(self, websocket: WebSocket, code: str, queue_size: int):
+        self.websocket = websocket
+        self.code = code
+        # deque(maxlen): appending to a full queue discards the oldest message
+        self.queue: Deque[str] = deque(maxlen=queue_size)   # pre-encoded frames
+        self.wakeup = asyncio.Event()
+        self.drop_streak = 0      # messages dropped since the last successful send
+        self.last_seen = time.monotonic()   # last message received from the client
+        self.task: Optional[asyncio.Task] = None
 
 
 class ConnectionManager:
-    def __init__(self):
-        # {code: [websocket1, websocket2, ...]}
-        self.active_connections: Dict[str, List[WebSocket]] = {}
-    
+    """Per-event rooms with non-blocking broadcast.
+
+    broadcast() only enqueues; every connection has its own sender task, so
+    a slow client delays nobody else. When a connection's queue is full the
+    oldest message is dropped; after `max_dropped` consecutive drops the
+    connection is closed with 1013 so the client reconnects and resyncs.
+
+    Frames go through a broadcast backend (see app.broadcast_bus), which
+    also reaches the rooms of other worker processes when configured.
+
+    Heartbeat: every `heartbeat_interval` seconds each connection is sent a
+    {"type": "ping"}; clients answer with {"type": "pong"}. A connection
+    that has sent nothing for `idle_timeout` seconds is closed (1001).
+    """
+
+    def __init__(self, queue_size: int = 32, max_dropped: int = 64,
+                 backend: Optional[InProcessBackend] = None,
+                 heartbeat_interval: float = 0, idle_timeout: float = 60.0):
+        self.queue_size = queue_size
+        self.max_dropped = max_dropped
+        self.heartbeat_interval = heartbeat_interval
+        self.idle_timeout = idle_timeout
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self.backend = backend or InProcessBackend()
+        self.backend.attach(self.deliver, _invalidate_event)
+        # {code: {websocket: peer}}
+        self.active_connections: Dict[str, Dict[WebSocket, _Peer]] = {}
+        # {code: {"dropped": n, "slow_disconnects": n, "reaped": n}} — cumulative
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self._closing: Set[asyncio.Task] = set()
+
     async def connect(self, websocket: WebSocket, code: str):
         await websocket.accept()
-        if code not in self.active_connections:
-            self.active_connections[code] = []
-        self.active_connections[code].append(websocket)
+        peer = _Peer(websocket, code, self.queue_size)
+        peer.task = asyncio.create_task(self._sender(peer))
+        self.active_connections.setdefault(code, {})[websocket] = peer
         print(f"Client connected to room {code}. Total connections: {len(self.active_connections[code])}")
-    
+
     def disconnect(self, websocket: WebSocket, code: str):
-        if code in self.active_connections:
-            self.active_connections[code].remove(websocket)
-            print(f"Client disconnected from room {code}. Remaining: {len(self.active_connections[code])}")
-            
-            # Clean up empty rooms
-            if len(self.active_connections[code]) == 0:
-                del self.active_connections[code]
-    
+        room = self.active_connections.get(code)
+        if room is None:
+            return
+        peer = room.pop(websocket, None)
+        if peer is None:
+            return
+        if peer.task is not asyncio.current_task():
+            peer.task.cancel()
+        print(f"Client disconnected from room {code}. Remaining: {len(room)}")
+
+        # Clean up empty rooms
+        if not room:
+            del self.active_connections[code]
+
+    def touch(self, websocket: WebSocket, code: str):
+        """Record that the client sent something (any message counts as alive)."""
+        peer = self.active_connections.get(code, {}).get(websocket)
+        if peer is not None:
+            peer.last_seen = time.monotonic()
+
+    async def start(self):
+        await self.backend.start()
+        if self.heartbeat_interval > 0 and self._heartbeat_task is None:
+            self._heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+
     async def broadcast(self, code: str, message: dict):
-        """Send message to all clients connected to a specific code"""
-        if code in self.active_connections:
-            dead_connections = []
-            for connection in self.active_connections[code]:
-                try:
-                    await connection.send_json(message)
-                except Exception as e:
-                    print(f"Error sending message: {e}")
-                    dead_connections.append(connection)
-            
-            # Remove dead connections
-            for connection in dead_connections:
-                self.disconnect(connection, code)
-
-
-manager = ConnectionManager()
+        """Queue message for every client in the room (in every worker);
+        returns without waiting for sends"""
+        if self.backend.local_only and code not in self.active_connections:
+            return
+        await self.backend.publish(code, encode(message))
+
+    async def broadcast_text(self, code: str, text: str):
+        """Like broadcast() for an already-encoded frame."""
+        await self.backend.publish(code, text)
+
+    async def publish_invalidation(self, code: str):
+        """Tell other workers to drop their cached state for an event (for
+        writes that do not broadcast, e.g. sessions and properties)."""
+        await self.backend.publish_invalidation(code)
+
+    def send(self, websocket: WebSocket, code: str, message: dict):
+        """Queue a message for one connection of this process (e.g. an ack)."""
+        peer = self.active_connections.get(code, {}).get(websocket)
+        if peer is not None:
+            peer.queue.append(encode(message))
+            peer.wakeup.set()
+
+    def deliver(self, code: str, text: str):
+        """Queue a frame for this process's members of the room."""
+        room = self.active_connections.get(code)
+        if not room:
+            return
+        for peer in list(room.values()):
+            if len(peer.queue) == peer.queue.maxlen:
+                peer.drop_streak += 1
+                self._count(code, "dropped")
+                if self.max_dropped and peer.drop_streak > self.max_dropped:
+                    self._drop_slow(peer)
+                    continue
+            peer.queue.append(text)
+            peer.wakeup.set()
+
+    def heartbeat(self, now: Optional[float] = None) -> int:
+        """Reap idle connections and ping the rest. Returns the number reaped."""
+        now = time.monotonic() if now is None else now
+        reaped = 0
+        for code, room in list(self.active_connections.items()):
+            for peer in list(room.values()):
+                if now - peer.last_seen > self.idle_timeout:
+                    print(f"Reaping idle client in room {code} ({now - peer.last_seen:.0f}s silent)")
+                    self._evict(peer, CLOSE_IDLE, "reaped")
+                    reaped += 1
+                elif len(peer.queue) < peer.queue.maxlen:   # never displace real messages
+                    peer.queue.append(_PING)
+                    peer.wakeup.set()
+        return reaped
+
+    async def close_all(self):
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+        await self.backend.stop()
+        tasks = list(self._closing)
+        for code, room in list(self.active_connections.items()):
+            for websocket, peer in list(room.items()):
+                self.disconnect(websocket, code)
+                tasks.append(peer.task)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        rooms = {}
+        for code in set(self.active_connections) | set(self._counters):
+            peers = self.active_connections.get(code, {}).values()
+            depths = [len(p.queue) for p in peers]
+            counters = self._counters.get(code, {})
+            rooms[code] = {
+                "connections":      len(depths),
+                "queued":           sum(depths),
+                "max_queue_depth":  max(depths, default=0),
+                "dropped":          counters.get("dropped", 0),
+                "slow_disconnects": counters.get("slow_disconnects", 0),
+                "reaped":           counters.get("reaped", 0),
+            }
+        return {
+            "queue_size":  self.queue_size,
+            "max_dropped": self.max_dropped,
+            "connections": sum(r["connections"] for r in rooms.values()),
+            "dropped":     sum(r["dropped"] for r in rooms.values()),
+            "reaped":      sum(r["reaped"] for r in rooms.values()),
+            "rooms":       rooms,
+            "bus":         self.backend.stats(),
+        }
+
+    # ── Internals ──────────────────────────────────────────────────────────
+
+    async def _sender(self, peer: _Peer):
+        try:
+            while True:
+                while not peer.queue:
+                    peer.wakeup.clear()
+                    await peer.wakeup.wait()
+                text = peer.queue.popleft()
+                await peer.websocket.send_text(text)
+                peer.drop_streak = 0
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error sending message: {e}")
+            self.disconnect(peer.websocket, peer.code)
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                self.heartbeat()
+            except Exception as e:
+                print(f"Heartbeat error: {e}")
+
+    def _drop_slow(self, peer: _Peer):
+        print(f"Closing slow client in room {peer.code} after {peer.drop_streak} dropped messages")
+        self._evict(peer, CLOSE_SLOW_CONSUMER, "slow_disconnects")
+
+    def _evict(self, peer: _Peer, close_code: int, counter: str):
+        self._count(peer.code, counter)
+        self.disconnect(peer.websocket, peer.code)
+        task = asyncio.create_task(self._close(peer.websocket, close_code))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _close(websocket: WebSocket, close_code: int):
+        try:
+            await websocket.close(code=close_code)
+        except Exception:
+            pass
+
+    def _count(self, code: str, key: str):
+        counters = self._counters.setdefault(code, {})
+        counters[key] = counters.get(key, 0) + 1
+
+
+def _invalidate_event(code: str):
+    # Another worker changed this event: drop everything cached for it here
+    meta_cache.invalidate(code)
+    session_index.invalidate(code)
+    data_versions.invalidate(code)
+    leaderboards.invalidate(code)
+
+
+manager = ConnectionManager(
+    settings.WS_SEND_QUEUE_SIZE, settings.WS_MAX_DROPPED, create_backend(settings),
+    settings.WS_HEARTBEAT_INTERVAL, settings.WS_IDLE_TIMEOUT,
+)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark: encoding cost of one broadcast to rooms of 10 / 100 / 1000.
+
+Compares the old per-connection `send_json` (one json.dumps per socket)
+with encoding once and sending the same text frame to every socket,
+using the stdlib encoder and, if installed, orjson. Sockets are no-op
+fakes, so the numbers are the event-loop CPU spent per broadcast.
+
+Usage: python benchmarks/bench_broadcast.py [--rooms 10 100 1000] [--repeat 200]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app import websocket_manager
+
+# Typical leaderboard_delta: one lane of four archers, a few rank moves
+MESSAGE = {
+    "type": "leaderboard_delta", "version": 1234,
+    "groups": {"male_recurve": {
+        "entries": [{
+            "id": pid, "name": f"Archer {pid}", "lane_shift": f"{pid}A",
+            "gender": "male", "shooting_type": "recurve", "group_type": "individual",
+            "age_category": "adult", "total_score": 540 - pid, "x_count": 9, "ten_count": 21,
+            "avg_score": 9.1, "rank": pid, "previous_rank": pid + 1,
+            "distance_scores": [{"distance_id": 1, "title": "70m", "score": 540 - pid,
+                                 "shots_count": 72, "shots_taken": 60}],
+        } for pid in range(1, 5)],
+        "ranks": [{"id": pid, "rank": pid} for pid in range(5, 25)],
+        "removed": [],
+    }},
+}
+
+
+class Sink:
+    """Socket stand-in; send_json mirrors Starlette's encoding."""
+
+    async def send_json(self, data):
+        json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+    async def send_text(self, text):
+        pass
+
+
+async def per_socket_json(sockets):
+    for ws in sockets:
+        await ws.send_json(MESSAGE)
+
+
+def encode_once(encoder):
+    async def run(sockets):
+        text = encoder(MESSAGE)
+        for ws in sockets:
+            await ws.send_text(text)
+    return run
+
+
+def stdlib(message):
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+
+async def timed(fn, sockets, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await fn(sockets)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+async def main(rooms, repeat):
+    variants = [("send_json per socket", per_socket_json),
+                ("encode once (json)", encode_once(stdlib))]
+    if websocket_manager.orjson is not None:
+        variants.append(("encode once (orjson)", encode_once(websocket_manager.encode)))
+
+    print(f"message: {len(stdlib(MESSAGE))} bytes, {repeat} broadcasts per cell, ms per broadcast\n")
+    print(f"{'room size':>10}" + "".join(f"{name:>24}" for name, _ in variants))
+    for size in rooms:
+        sockets = [Sink() for _ in range(size)]
+        cells = [await timed(fn, sockets, repeat) for _, fn in variants]
+        print(f"{size:>10}" + "".join(f"{c:>24.3f}" for c in cells))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rooms", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.rooms, args.repeat))
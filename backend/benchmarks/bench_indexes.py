@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark: hot-path queries with and without the migration-1 indexes.
+
+Builds a synthetic event database (participants × distances × shots),
+times the leaderboard aggregate, lane lookup, participant state and
+per-distance queries, then drops the indexes and times them again.
+
+Usage: python benchmarks/bench_indexes.py [--participants 600] [--shots 72]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.config import settings
+from app.database import DatabaseManager, pool
+from app.migrations import MIGRATIONS
+
+QUERIES = {
+    "leaderboard aggregate": ("""
+        SELECT participant_id, distance_id, SUM(score), COUNT(id),
+               COUNT(CASE WHEN is_x=1 THEN 1 END), COUNT(CASE WHEN score=10 THEN 1 END)
+        FROM results GROUP BY participant_id, distance_id
+    """, lambda n: ()),
+    "lane participants": (
+        "SELECT id, name FROM participants WHERE lane_number=? ORDER BY shift",
+        lambda n: (random.randint(1, n // 2),),
+    ),
+    "participant state": (
+        "SELECT distance_id, shot_number, score, is_x FROM results "
+        "WHERE participant_id=? ORDER BY distance_id, shot_number",
+        lambda n: (random.randint(1, n),),
+    ),
+    "participant × distance detail": (
+        "SELECT shot_number, score, is_x FROM results "
+        "WHERE participant_id=? AND distance_id=? ORDER BY shot_number",
+        lambda n: (random.randint(1, n), random.randint(1, 4)),
+    ),
+    "distance totals": (
+        "SELECT participant_id, SUM(score), COUNT(CASE WHEN is_x=1 THEN 1 END) "
+        "FROM results WHERE distance_id=? GROUP BY participant_id",
+        lambda n: (random.randint(1, 4),),
+    ),
+    "active distances": (
+        "SELECT id FROM distances WHERE status IN ('active','finished') ORDER BY sort_order",
+        lambda n: (),
+    ),
+}
+
+
+def build(db_path: str, participants: int, shots: int):
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT INTO distances (title, shots_count, sort_order, status) VALUES (?, ?, ?, ?)",
+        [(f"D{i}", shots, i, "finished" if i < 3 else "active") for i in range(4)],
+    )
+    conn.executemany(
+        "INSERT INTO participants (name, lane_number, shift, gender, shooting_type) VALUES (?, ?, ?, ?, ?)",
+        [(f"P{i}", i // 2 + 1, "AB"[i % 2], "mf"[i % 2], "recurve") for i in range(participants)],
+    )
+    conn.executemany(
+        "INSERT INTO results (participant_id, distance_id, shot_number, score, is_x) VALUES (?, ?, ?, ?, ?)",
+        (
+            (pid, did, shot, random.randint(5, 10), random.random() < 0.1)
+            for pid in range(1, participants + 1)
+            for did in range(1, 5)
+            for shot in range(1, shots + 1)
+        ),
+    )
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+
+
+def time_queries(db_path: str, participants: int, repeat: int) -> dict:
+    conn = sqlite3.connect(db_path)
+    timings = {}
+    for name, (sql, params) in QUERIES.items():
+        reps = repeat if params(participants) and name != "distance totals" else 5
+        start = time.perf_counter()
+        for _ in range(reps):
+            conn.execute(sql, params(participants)).fetchall()
+        timings[name] = (time.perf_counter() - start) / reps * 1000
+    conn.close()
+    return timings
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--participants", type=int, default=600)
+    parser.add_argument("--shots", type=int, default=72)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.DATABASE_DIR = tmp
+        db = DatabaseManager("BENCH")
+        await db.init_db()
+        await pool.close_all()
+        build(db.db_path, args.participants, args.shots)
+        rows = args.participants * 4 * args.shots
+        print(f"Event: {args.participants} participants, 4 distances, {rows} shots")
+
+        indexed = time_queries(db.db_path, args.participants, args.repeat)
+
+        conn = sqlite3.connect(db.db_path)
+        for stmt in MIGRATIONS[0][2]:
+            name = stmt.split("EXISTS", 1)[1].split()[0]
+            conn.execute(f"DROP INDEX {name}")
+        conn.execute("ANALYZE")
+        conn.commit()
+        conn.close()
+        plain = time_queries(db.db_path, args.participants, args.repeat)
+
+    print(f"\n{'query':34} {'no index':>10} {'indexed':>10} {'speedup':>8}")
+    for name in QUERIES:
+        print(f"{name:34} {plain[name]:9.3f}ms {indexed[name]:9.3f}ms {plain[name] / indexed[name]:7.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
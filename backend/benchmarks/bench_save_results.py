@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark: POST /api/results/{code} with 1 / 30 / 300 shots per request.
+
+For each batch size, times the full request through the ASGI app and the
+write statements alone: one INSERT OR REPLACE per shot (the previous
+path) against a single executemany.
+
+Usage: python benchmarks/bench_save_results.py [--sizes 1 30 300] [--repeat 30]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.database import DatabaseManager, pool
+from app.main import app
+
+CODE = "BENCH1"
+INSERT = """
+    INSERT OR REPLACE INTO results (participant_id, distance_id, shot_number, score, is_x)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+
+def setup(client, size):
+    """Event with one active distance of `size` shots and four archers on lane 1."""
+    created = client.post("/api/events/create", json={"code": CODE, "shots_count": 30}).json()
+    host = {"X-Session-Id": created["session_id"]}
+    did = client.get(f"/api/distances/{CODE}").json()[0]["id"]
+    client.patch(f"/api/distances/{CODE}/{did}", json={"shots_count": max(size, 1)}, headers=host)
+    client.patch(f"/api/events/{CODE}", json={"status": "started"}, headers=host)
+    client.patch(f"/api/distances/{CODE}/{did}", json={"status": "active"}, headers=host)
+    pids = [client.post(f"/api/participants/{CODE}", headers=host, json={
+        "name": f"P{i}", "lane_number": 1, "shift": "ABCD"[i]}).json()["id"] for i in range(4)]
+    lane = client.post(f"/api/sessions/{CODE}/lane/1", json={}).json()
+    return did, pids, {"X-Session-Id": lane["session_id"]}
+
+
+def batch(did, pids, size, salt):
+    return [{"participant_id": pids[i % len(pids)], "distance_id": did,
+             "shot_number": i // len(pids) + 1, "score": (i + salt) % 11, "is_x": False}
+            for i in range(size)]
+
+
+async def time_statements(rows, repeat):
+    db = DatabaseManager(CODE)
+    out = {}
+    async with db.get_connection() as conn:
+        for name in ("per-row execute", "executemany"):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                await conn.execute("BEGIN IMMEDIATE")
+                if name == "executemany":
+                    await conn.executemany(INSERT, rows)
+                else:
+                    for row in rows:
+                        await conn.execute(INSERT, row)
+                await conn.rollback()
+            out[name] = (time.perf_counter() - start) / repeat * 1000
+    return out
+
+
+def main(sizes, repeat):
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.DATABASE_DIR = tmp
+        print(f"{'shots':>6} {'request':>10} {'per-row execute':>17} {'executemany':>13}")
+        for size in sizes:
+            with TestClient(app) as client:
+                did, pids, lane = setup(client, size)
+                client.post(f"/api/results/{CODE}", json=batch(did, pids, size, 0), headers=lane)
+
+                start = time.perf_counter()
+                for i in range(repeat):
+                    r = client.post(f"/api/results/{CODE}", json=batch(did, pids, size, i), headers=lane)
+                    assert r.status_code == 200, r.text
+                request_ms = (time.perf_counter() - start) / repeat * 1000
+
+                rows = [tuple(s.values()) for s in batch(did, pids, size, 1)]
+                stmts = asyncio.run(time_statements(rows, repeat))
+            asyncio.run(pool.close_all())
+            os.remove(DatabaseManager(CODE).db_path)
+            print(f"{size:>6} {request_ms:>8.2f}ms {stmts['per-row execute']:>15.2f}ms {stmts['executemany']:>11.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 30, 300])
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args()
+    main(args.sizes, args.repeat)
@@ -0,0 +1,19 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.config import settings
+from app.database import pool
+
+
+@pytest.fixture
+def db_dir(tmp_path, monkeypatch):
+    """Point DATABASE_DIR at a temp dir and drop pooled connections afterwards."""
+    monkeypatch.setattr(settings, "DATABASE_DIR", str(tmp_path))
+    yield tmp_path
+    asyncio.run(pool.close_all())
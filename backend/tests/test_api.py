@@ -0,0 +1,352 @@
+"""
+API tests for the Shooting Scoring System (FastAPI TestClient).
+
+Run with: python -m pytest tests/test_api.py -v
+"""
+
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.aggregates import rebuild_totals
+from app.database import DatabaseManager, pool
+from app.event_cache import data_versions, meta_cache
+from app.leaderboard import EventLeaderboard
+from app.websocket_manager import manager as ws_manager
+
+
+@pytest.fixture
+def client(db_dir):
+    with TestClient(app) as c:
+        yield c
+
+
+@pytest.fixture
+def event(client):
+    """Started event with one active distance and one participant on lane 1."""
+    created = client.post("/api/events/create", json={"code": "APITEST", "shots_count": 6}).json()
+    host = {"X-Session-Id": created["session_id"]}
+    client.patch("/api/events/APITEST", json={"status": "started"}, headers=host)
+    dist_id = client.get("/api/distances/APITEST").json()[0]["id"]
+    client.patch(f"/api/distances/APITEST/{dist_id}", json={"status": "active"}, headers=host)
+    pid = client.post("/api/participants/APITEST", headers=host, json={
+        "name": "Alice", "lane_number": 1, "shift": "A",
+        "gender": "female", "shooting_type": "recurve",
+    }).json()["id"]
+    lane = client.post("/api/sessions/APITEST/lane/1", json={}).json()
+    return {
+        "code": "APITEST", "host": host, "distance_id": dist_id, "participant_id": pid,
+        "lane": {"X-Session-Id": lane["session_id"]},
+    }
+
+
+def _shots(event, scores, start=1):
+    return [
+        {"participant_id": event["participant_id"], "distance_id": event["distance_id"],
+         "shot_number": start + i, "score": s, "is_x": False}
+        for i, s in enumerate(scores)
+    ]
+
+
+class TestRequestScopedConnection:
+    """Auth, status checks and the endpoint body share one connection"""
+
+    def test_save_results_uses_one_connection(self, client, event):
+        before = pool.stats()
+        r = client.post("/api/results/APITEST", json=_shots(event, [10, 9, 8]), headers=event["lane"])
+        assert r.status_code == 200
+        after = pool.stats()
+        assert (after["hits"] + after["misses"]) - (before["hits"] + before["misses"]) == 1
+
+    def test_unknown_or_invalid_code_is_404(self, client):
+        assert client.get("/api/distances/NOPE").status_code == 404
+        assert client.get("/api/distances/bad-code").status_code == 404
+
+    def test_failed_request_rolls_back(self, client, event):
+        bad = _shots(event, [10]) + [{**_shots(event, [9], start=2)[0], "distance_id": 999}]
+        r = client.post("/api/results/APITEST", json=bad, headers=event["lane"])
+        assert r.status_code == 404
+        state = client.get(f"/api/results/APITEST/state/{event['participant_id']}").json()
+        assert state["distances"][0]["total_score"] is None
+
+    def test_wrong_lane_session_rejected(self, client, event):
+        other = client.post("/api/sessions/APITEST/lane/2", json={}).json()
+        r = client.post("/api/results/APITEST", json=_shots(event, [10]),
+                        headers={"X-Session-Id": other["session_id"]})
+        assert r.status_code == 401
+
+
+class TestEventMetaCache:
+    """Status / property / distance checks are served from memory and
+    invalidated by the endpoints that change them"""
+
+    def test_status_check_needs_no_query(self, client, event):
+        client.get("/api/events/APITEST")   # warm
+        meta = meta_cache._meta["APITEST"]
+        assert meta.props["event_status"] == "started"
+        assert meta.distances[event["distance_id"]] == "active"
+
+    def test_update_event_invalidates(self, client, event):
+        client.get("/api/events/APITEST")
+        client.patch("/api/events/APITEST", json={"status": "finished"}, headers=event["host"])
+        assert client.get("/api/events/APITEST").json()["status"] == "finished"
+        r = client.post("/api/results/APITEST", json=_shots(event, [10]), headers=event["lane"])
+        assert r.status_code == 403
+
+    def test_update_properties_invalidates(self, client, event):
+        assert client.get("/api/properties/APITEST/public").json()["client_allow_add_participant"] is True
+        client.patch("/api/properties/APITEST", json={"client_allow_add_participant": "false"},
+                     headers=event["host"])
+        assert client.get("/api/properties/APITEST/public").json()["client_allow_add_participant"] is False
+        r = client.post("/api/participants/APITEST", headers=event["lane"],
+                        json={"name": "Bob", "lane_number": 1, "shift": "B"})
+        assert r.status_code == 403
+
+    def test_update_distance_invalidates(self, client, event):
+        client.patch(f"/api/distances/APITEST/{event['distance_id']}",
+                     json={"status": "finished"}, headers=event["host"])
+        r = client.post("/api/results/APITEST", json=_shots(event, [10]), headers=event["lane"])
+        assert r.status_code == 403
+
+
+class TestSessionIndex:
+    """Tokens resolve from memory and stay coherent with login / reset"""
+
+    def test_host_relogin_revokes_old_token(self, client, event):
+        new = client.post("/api/sessions/APITEST/host", json={"password": "WRONG"})
+        assert new.status_code == 401
+        props = client.get("/api/properties/APITEST", headers=event["host"]).json()
+        new = client.post("/api/sessions/APITEST/host", json={"password": props["host_password"]}).json()
+        assert new["session_id"] != event["host"]["X-Session-Id"]
+        assert client.get("/api/sessions/APITEST/lanes", headers=event["host"]).status_code == 401
+        assert client.get("/api/sessions/APITEST/lanes",
+                          headers={"X-Session-Id": new["session_id"]}).status_code == 200
+
+    def test_lane_reset_revokes_token(self, client, event):
+        assert client.post("/api/results/APITEST", json=_shots(event, [9]),
+                           headers=event["lane"]).status_code == 200
+        client.delete("/api/sessions/APITEST/lane/1", headers=event["host"])
+        assert client.post("/api/results/APITEST", json=_shots(event, [9]),
+                           headers=event["lane"]).status_code == 401
+
+    def test_viewer_token_cannot_write(self, client, event):
+        viewer = client.post("/api/sessions/APITEST/viewer", json={}).json()
+        r = client.post("/api/results/APITEST", json=_shots(event, [9]),
+                        headers={"X-Session-Id": viewer["session_id"]})
+        assert r.status_code == 401
+
+
+class TestResultTotals:
+    """result_totals follows every write to results"""
+
+    @staticmethod
+    def _row(client, event):
+        board = client.get("/api/results/APITEST/leaderboard").json()
+        return board["female_recurve"][0]
+
+    def test_totals_follow_saves_and_replacements(self, client, event):
+        client.post("/api/results/APITEST", json=_shots(event, [10, 9, 10]), headers=event["lane"])
+        row = self._row(client, event)
+        assert (row["total_score"], row["ten_count"]) == (29, 2)
+
+        # INSERT OR REPLACE of shot 2 must replace, not add
+        client.post("/api/results/APITEST", json=_shots(event, [5], start=2), headers=event["lane"])
+        row = self._row(client, event)
+        assert (row["total_score"], row["distance_scores"][0]["shots_taken"]) == (25, 3)
+
+    def test_delete_results_clears_totals(self, client, event):
+        client.post("/api/results/APITEST", json=_shots(event, [10]), headers=event["lane"])
+        client.delete(f"/api/results/APITEST/{event['participant_id']}", headers=event["host"])
+        assert client.get("/api/results/APITEST/leaderboard").json() == {}
+
+    @pytest.mark.asyncio
+    async def test_rebuild_matches_results(self, db_dir):
+        db = DatabaseManager("REBUILD")
+        await db.init_db()
+        async with db.get_connection() as conn:
+            await conn.executemany(
+                "INSERT INTO results (participant_id, distance_id, shot_number, score, is_x) VALUES (?, ?, ?, ?, ?)",
+                [(1, 1, 1, 10, 1), (1, 1, 2, 8, 0), (2, 1, 1, 7, 0)],
+            )
+            assert await rebuild_totals(conn) == 2
+            cursor = await conn.execute(
+                "SELECT total, shots, x_count, ten_count FROM result_totals WHERE participant_id=1"
+            )
+            assert await cursor.fetchone() == (18, 2, 1, 1)
+
+
+class TestLeaderboardEngine:
+    """Ranks are maintained incrementally in memory"""
+
+    @staticmethod
+    def _board(totals):
+        distances = [(1, "D1", 6, "active")]
+        participants = {pid: (f"P{pid}", pid, "A", "adult", "individual", "male", "recurve")
+                        for pid in (1, 2, 3, 4)}
+        return EventLeaderboard(distances, participants, totals)
+
+    def test_order_and_tie_breaks(self):
+        board = self._board({
+            1: {1: (50, 6, 0, 2)},
+            2: {1: (50, 6, 1, 1)},     # same total, more X -> ahead of 1
+            3: {1: (55, 6, 0, 0)},
+            4: {1: (50, 6, 1, 1)},     # tied with 2 on every key -> shared rank
+        })
+        rows = board.render()["male_recurve"]
+        assert [(r["id"], r["rank"]) for r in rows] == [(3, 1), (2, 2), (4, 2), (1, 4)]
+
+    def test_delta_moves_entry(self):
+        board = self._board({1: {1: (10, 1, 0, 1)}, 2: {1: (9, 1, 0, 0)}})
+        assert board.rank_of(2) == 2
+        board.set_totals(2, 1, (19, 2, 0, 1))
+        assert board.rank_of(2) == 1 and board.rank_of(1) == 2
+        board.set_totals(2, 1, None)
+        assert board.rank_of(2) is None
+        assert [r["id"] for r in board.render()["male_recurve"]] == [1]
+
+    def test_apply_returns_rank_delta(self):
+        board = self._board({1: {1: (10, 1, 0, 1)}, 2: {1: (9, 1, 0, 0)}, 3: {1: (8, 1, 0, 0)}})
+        delta = board.apply({(3, 1): (20, 2, 0, 1)})["male_recurve"]
+        assert [(e["id"], e["rank"], e["previous_rank"]) for e in delta["entries"]] == [(3, 1, 3)]
+        assert delta["ranks"] == [{"id": 1, "rank": 2}, {"id": 2, "rank": 3}]
+        assert delta["removed"] == []
+
+    def test_reads_need_no_connection(self, client, event):
+        client.post("/api/results/APITEST", json=_shots(event, [10]), headers=event["lane"])
+        client.get("/api/results/APITEST/leaderboard")
+        before = pool.stats()
+        client.post("/api/results/APITEST", json=_shots(event, [9], start=2), headers=event["lane"])
+        after_write = pool.stats()
+        board = client.get("/api/results/APITEST/leaderboard").json()
+        assert pool.stats()["hits"] + pool.stats()["misses"] == after_write["hits"] + after_write["misses"]
+        assert after_write["hits"] + after_write["misses"] == before["hits"] + before["misses"] + 1
+        assert board["female_recurve"][0]["total_score"] == 19
+
+    def test_participant_update_regroups(self, client, event):
+        client.post("/api/results/APITEST", json=_shots(event, [10]), headers=event["lane"])
+        assert "female_recurve" in client.get("/api/results/APITEST/leaderboard").json()
+        client.put(f"/api/participants/APITEST/{event['participant_id']}", headers=event["host"], json={
+            "name": "Alice", "lane_number": 1, "shift": "A",
+            "gender": "female", "shooting_type": "compound",
+        })
+        assert list(client.get("/api/results/APITEST/leaderboard").json()) == ["female_compound"]
+
+
+class TestDataVersion:
+    """ETag / If-None-Match on leaderboard, participants and distances"""
+
+    PATHS = ("/api/results/APITEST/leaderboard", "/api/participants/APITEST", "/api/distances/APITEST")
+
+    def test_not_modified_until_write(self, client, event):
+        for path in self.PATHS:
+            tag = client.get(path).headers["ETag"]
+            assert client.get(path, headers={"If-None-Match": tag}).status_code == 304
+            client.post("/api/results/APITEST", json=_shots(event, [7]), headers=event["lane"])
+            r = client.get(path, headers={"If-None-Match": tag})
+            assert r.status_code == 200 and r.headers["ETag"] != tag
+
+    def test_every_write_path_bumps(self, client, event):
+        writes = [
+            lambda: client.post("/api/participants/APITEST", headers=event["host"], json={
+                "name": "Bob", "lane_number": 2, "shift": "A"}),
+            lambda: client.post("/api/distances/APITEST", headers=event["host"],
+                                json={"title": "D2", "shots_count": 3}),
+            lambda: client.patch("/api/events/APITEST", json={"status": "finished"}, headers=event["host"]),
+        ]
+        seen = {data_versions.peek("APITEST")}
+        for write in writes:
+            assert write().status_code == 200
+            seen.add(data_versions.peek("APITEST"))
+        assert len(seen) == len(writes) + 1
+
+    def test_304_runs_no_query(self, client, event):
+        tag = client.get(self.PATHS[0]).headers["ETag"]
+        before = pool.stats()
+        assert client.get(self.PATHS[0], headers={"If-None-Match": tag}).status_code == 304
+        assert pool.stats()["hits"] == before["hits"] and pool.stats()["misses"] == before["misses"]
+
+    def test_version_survives_restart(self, client, event):
+        client.post("/api/results/APITEST", json=_shots(event, [7]), headers=event["lane"])
+        tag = client.get(self.PATHS[0]).headers["ETag"]
+        data_versions.invalidate("APITEST")
+        assert client.get(self.PATHS[0], headers={"If-None-Match": tag}).status_code == 304
+
+
+class TestLiveUpdates:
+    """Writes push leaderboard deltas / change notices into the event room"""
+
+    def test_save_pushes_delta(self, client, event):
+        with client.websocket_connect("/ws/APITEST") as ws:
+            client.post("/api/results/APITEST", json=_shots(event, [10, 9]), headers=event["lane"])
+            msg = ws.receive_json()
+        assert msg["type"] == "leaderboard_delta"
+        assert msg["version"] == data_versions.peek("APITEST")
+        entry = msg["groups"]["female_recurve"]["entries"][0]
+        assert (entry["id"], entry["total_score"], entry["rank"], entry["previous_rank"]) == \
+            (event["participant_id"], 19, 1, None)
+
+    def test_other_writes_push_data_changed(self, client, event):
+        with client.websocket_connect("/ws/APITEST") as ws:
+            client.post("/api/distances/APITEST", headers=event["host"], json={"title": "D2", "shots_count": 3})
+            msg = ws.receive_json()
+        assert msg == {"type": "data_changed", "version": data_versions.peek("APITEST")}
+
+    def test_pong_keeps_connection(self, client, event):
+        with client.websocket_connect("/ws/APITEST") as ws:
+            peer = next(iter(ws_manager.active_connections["APITEST"].values()))
+            peer.last_seen -= 1000
+            ws.send_json({"type": "pong"})
+            ws.send_json({"type": "refresh"})      # processed after the pong
+            assert ws.receive_json() == {"type": "refresh"}
+            assert time.monotonic() - peer.last_seen < ws_manager.idle_timeout
+
+
+class TestSubmitShotsOverWebSocket:
+    """submit_shots runs the save_results path and acks the sender"""
+
+    def test_batch_is_saved_broadcast_and_acked(self, client, event):
+        with client.websocket_connect("/ws/APITEST") as ws:
+            ws.send_json({"type": "submit_shots", "batch_id": "b1",
+                          "session_id": event["lane"]["X-Session-Id"],
+                          "results": _shots(event, [10, 10, 9])})
+            delta = ws.receive_json()
+            ack = ws.receive_json()
+        assert delta["type"] == "leaderboard_delta"
+        assert ack == {"type": "shots_ack", "batch_id": "b1", "ok": True,
+                       "seq": data_versions.peek("APITEST"), "count": 3}
+        state = client.get(f"/api/results/APITEST/state/{event['participant_id']}").json()
+        assert state["distances"][0]["total_score"] == 29
+
+    def test_rejected_batch_is_nacked(self, client, event):
+        other = client.post("/api/sessions/APITEST/lane/2", json={}).json()
+        with client.websocket_connect("/ws/APITEST") as ws:
+            ws.send_json({"type": "submit_shots", "batch_id": "b2",
+                          "session_id": other["session_id"], "results": _shots(event, [10])})
+            assert ws.receive_json() == {"type": "shots_ack", "batch_id": "b2", "ok": False,
+                                         "status": 401, "detail": "Invalid session"}
+            ws.send_json({"type": "submit_shots", "batch_id": "b3", "results": [{"score": "x"}]})
+            assert ws.receive_json()["status"] == 422
+
+
+class TestBulkSave:
+    """Every participant in a batch is authorized, not just the first"""
+
+    def test_batch_touching_another_lane_rejected(self, client, event):
+        other = client.post("/api/participants/APITEST", headers=event["host"], json={
+            "name": "Bob", "lane_number": 2, "shift": "A"}).json()["id"]
+        batch = _shots(event, [10]) + [{**_shots(event, [9])[0], "participant_id": other}]
+        r = client.post("/api/results/APITEST", json=batch, headers=event["lane"])
+        assert r.status_code == 401
+        # The host may write for both lanes in one batch
+        assert client.post("/api/results/APITEST", json=batch, headers=event["host"]).status_code == 200
+
+    def test_unknown_participant_is_404(self, client, event):
+        batch = [{**_shots(event, [9])[0], "participant_id": 999}]
+        assert client.post("/api/results/APITEST", json=batch, headers=event["lane"]).status_code == 404
+
+    def test_empty_batch_still_needs_session(self, client, event):
+        assert client.post("/api/results/APITEST", json=[],
+                           headers={"X-Session-Id": "bogus"}).status_code == 401
+        assert client.post("/api/results/APITEST", json=[], headers=event["lane"]).status_code == 200
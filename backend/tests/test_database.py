@@ -0,0 +1,133 @@
+"""
+Tests for DatabaseManager and the per-event connection pool.
+
+Run with: python -m pytest tests/test_database.py -v
+"""
+
+import os
+import sqlite3
+
+import pytest
+
+from app import database
+from app.database import DatabaseManager, ConnectionPool, MaintenanceScheduler, pool
+from app.migrations import SCHEMA_VERSION, get_schema_version
+
+
+class TestConnectionPool:
+    """Connections are reused per event and evicted LRU under the cap"""
+
+    @pytest.mark.asyncio
+    async def test_connection_reused(self, db_dir):
+        db = DatabaseManager("POOLA")
+        await db.init_db()
+        async with db.get_connection() as first:
+            pass
+        async with db.get_connection() as second:
+            pass
+        assert first is second
+        assert pool.stats()["idle"] == 1
+
+    @pytest.mark.asyncio
+    async def test_uncommitted_work_rolled_back_on_release(self, db_dir):
+        db = DatabaseManager("POOLB")
+        await db.init_db()
+        async with db.get_connection() as conn:
+            await conn.execute("INSERT INTO properties (key, value) VALUES ('k', 'v')")
+        async with db.get_connection() as conn:
+            cursor = await conn.execute("SELECT COUNT(*) FROM properties WHERE key='k'")
+            assert (await cursor.fetchone())[0] == 0
+
+    @pytest.mark.asyncio
+    async def test_lru_eviction_respects_cap(self, db_dir):
+        small = ConnectionPool(per_event=2, max_connections=2)
+        dbs = [DatabaseManager(code) for code in ("LRUA", "LRUB", "LRUC")]
+        for db in dbs:
+            await db.init_db()
+
+        for db in dbs:
+            conn = await small.acquire(db.code, db.db_path)
+            await small.release(conn)
+
+        stats = small.stats()
+        assert stats["open"] <= 2
+        assert stats["evictions"] == 1
+        assert "LRUA" not in small._idle
+        await small.close_all()
+        assert small.stats()["open"] == 0
+
+    @pytest.mark.asyncio
+    async def test_close_event_retires_checked_out_connection(self, db_dir):
+        db = DatabaseManager("POOLC")
+        await db.init_db()
+        conn = await pool.acquire(db.code, db.db_path)
+        await pool.close_event(db.code)
+        await pool.release(conn)
+        assert db.code not in pool._idle
+
+
+class TestStorageProfile:
+    """Every pooled connection gets the configured pragmas"""
+
+    @pytest.mark.asyncio
+    async def test_pragmas_applied(self, db_dir):
+        db = DatabaseManager("PRAGMA")
+        await db.init_db()
+        async with db.get_connection() as conn:
+            cursor = await conn.execute("PRAGMA journal_mode")
+            assert (await cursor.fetchone())[0] == "wal"
+            cursor = await conn.execute("PRAGMA synchronous")
+            assert (await cursor.fetchone())[0] == 1   # NORMAL
+            cursor = await conn.execute("PRAGMA busy_timeout")
+            assert (await cursor.fetchone())[0] == 5000
+
+    @pytest.mark.asyncio
+    async def test_maintenance_checkpoints_touched_events(self, db_dir):
+        db = DatabaseManager("MAINT")
+        await db.init_db()
+        async with db.get_connection() as conn:
+            await conn.execute("INSERT INTO properties (key, value) VALUES ('k', 'v')")
+            await conn.commit()
+
+        scheduler = MaintenanceScheduler(interval=0)
+        await scheduler.run_once()
+        assert scheduler.checkpoints >= 1
+        assert os.path.getsize(db.db_path + "-wal") == 0
+
+        # Nothing touched since the previous run -> nothing to do
+        await scheduler.run_once()
+        assert scheduler.checkpoints == 1
+
+
+class TestMigrations:
+    """Schema versions are tracked in properties and applied on first open"""
+
+    @pytest.mark.asyncio
+    async def test_fresh_database_is_current(self, db_dir):
+        db = DatabaseManager("MIGRA")
+        await db.init_db()
+        async with db.get_connection() as conn:
+            assert await get_schema_version(conn) == SCHEMA_VERSION
+
+    @pytest.mark.asyncio
+    async def test_existing_database_upgraded_on_first_open(self, db_dir):
+        db = DatabaseManager("MIGRB")
+        await db.init_db()
+        # Simulate a file created before migrations existed
+        legacy = sqlite3.connect(db.db_path)
+        for (name,) in legacy.execute(
+            "SELECT name FROM sqlite_master WHERE type='index' AND name LIKE 'idx_%'"
+        ).fetchall():
+            legacy.execute(f"DROP INDEX {name}")
+        legacy.execute("DELETE FROM properties WHERE key='schema_version'")
+        legacy.commit()
+        legacy.close()
+        await pool.close_event(db.code)
+        database._migrated.discard(db.db_path)
+
+        async with db.get_connection() as conn:
+            assert await get_schema_version(conn) == SCHEMA_VERSION
+            cursor = await conn.execute(
+                "SELECT name FROM sqlite_master WHERE type='index' AND name='idx_participants_lane'"
+            )
+            assert await cursor.fetchone() is not None
@@ -0,0 +1,178 @@
+"""
+ConnectionManager tests with in-memory fake sockets.
+
+Run with: python -m pytest tests/test_websocket.py -v
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from app.broadcast_bus import SQLiteBackend
+from app.event_cache import data_versions, session_index
+from app.websocket_manager import CLOSE_IDLE, CLOSE_SLOW_CONSUMER, ConnectionManager, encode
+
+
+class FakeSocket:
+    def __init__(self, blocked: bool = False):
+        self.sent = []
+        self.closed_with = None
+        self.gate = asyncio.Event()
+        if not blocked:
+            self.gate.set()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        await self.gate.wait()
+        self.sent.append(json.loads(text))
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+class TestBroadcast:
+    async def test_slow_client_does_not_block_others(self):
+        mgr = ConnectionManager(queue_size=4, max_dropped=0)
+        slow, fast = FakeSocket(blocked=True), FakeSocket()
+        await mgr.connect(slow, "ROOM")
+        await mgr.connect(fast, "ROOM")
+
+        for i in range(3):
+            await mgr.broadcast("ROOM", {"n": i})
+        await _settle()
+        assert [m["n"] for m in fast.sent] == [0, 1, 2]
+        assert slow.sent == []
+
+        slow.gate.set()
+        await _settle()
+        assert [m["n"] for m in slow.sent] == [0, 1, 2]
+        await mgr.close_all()
+
+    async def test_full_queue_drops_oldest(self):
+        mgr = ConnectionManager(queue_size=2, max_dropped=0)
+        sock = FakeSocket(blocked=True)
+        await mgr.connect(sock, "ROOM")
+        await _settle()                  # sender now waiting for messages
+
+        await mgr.broadcast("ROOM", {"n": 0})
+        await _settle()                  # message 0 is in flight
+        for i in range(1, 5):            # 1..4 hit a queue of 2
+            await mgr.broadcast("ROOM", {"n": i})
+        stats = mgr.stats()["rooms"]["ROOM"]
+        assert stats["dropped"] == 2 and stats["queued"] == 2
+
+        sock.gate.set()
+        await _settle()
+        assert [m["n"] for m in sock.sent] == [0, 3, 4]
+        await mgr.close_all()
+
+    async def test_persistently_slow_client_is_closed(self):
+        mgr = ConnectionManager(queue_size=1, max_dropped=3)
+        stuck, ok = FakeSocket(blocked=True), FakeSocket()
+        await mgr.connect(stuck, "ROOM")
+        await mgr.connect(ok, "ROOM")
+        await _settle()
+
+        for i in range(10):
+            await mgr.broadcast("ROOM", {"n": i})
+            await _settle()              # a healthy client keeps up between messages
+        assert stuck.closed_with == CLOSE_SLOW_CONSUMER
+        assert len(mgr.active_connections["ROOM"]) == 1
+        assert mgr.stats()["rooms"]["ROOM"]["slow_disconnects"] == 1
+        assert len(ok.sent) == 10
+        await mgr.close_all()
+
+    async def test_failed_send_removes_connection(self):
+        class Broken(FakeSocket):
+            async def send_text(self, text):
+                raise RuntimeError("gone")
+
+        mgr = ConnectionManager()
+        await mgr.connect(Broken(), "ROOM")
+        await mgr.broadcast("ROOM", {"n": 1})
+        await _settle()
+        assert "ROOM" not in mgr.active_connections
+
+    async def test_message_encoded_once(self, monkeypatch):
+        from app import websocket_manager
+        calls = []
+        monkeypatch.setattr(websocket_manager, "encode", lambda m: calls.append(m) or encode(m))
+        mgr = ConnectionManager()
+        socks = [FakeSocket() for _ in range(5)]
+        for s in socks:
+            await mgr.connect(s, "ROOM")
+        await mgr.broadcast("ROOM", {"type": "refresh", "name": "Zoë"})
+        await _settle()
+        assert len(calls) == 1
+        assert all(s.sent == [{"type": "refresh", "name": "Zoë"}] for s in socks)
+        await mgr.close_all()
+
+
+@pytest.mark.asyncio
+class TestSQLiteBus:
+    """Two managers sharing a bus file behave like two uvicorn workers"""
+
+    async def test_frames_reach_other_worker(self, tmp_path):
+        path = str(tmp_path / "bus.db")
+        a = ConnectionManager(backend=SQLiteBackend(path, poll_interval=3600))
+        b = ConnectionManager(backend=SQLiteBackend(path, poll_interval=3600))
+        await a.start()
+        await b.start()
+        on_a, on_b = FakeSocket(), FakeSocket()
+        await a.connect(on_a, "ROOM")
+        await b.connect(on_b, "ROOM")
+
+        await a.broadcast("ROOM", {"type": "refresh"})
+        assert await a.backend.poll_once() == 0        # own frames are not echoed
+        assert await b.backend.poll_once() == 1
+        await _settle()
+        assert on_a.sent == on_b.sent == [{"type": "refresh"}]
+        await a.close_all()
+        await b.close_all()
+
+    async def test_remote_change_drops_local_caches(self, tmp_path):
+        path = str(tmp_path / "bus.db")
+        a = ConnectionManager(backend=SQLiteBackend(path, poll_interval=3600))
+        b = ConnectionManager(backend=SQLiteBackend(path, poll_interval=3600))
+        await a.start()
+        await b.start()
+        session_index._index["ROOM"] = {}
+        data_versions.set("ROOM", 7)
+
+        await a.publish_invalidation("ROOM")
+        await b.backend.poll_once()
+        assert "ROOM" not in session_index._index
+        assert data_versions.peek("ROOM") is None
+        await a.close_all()
+        await b.close_all()
+
+
+@pytest.mark.asyncio
+class TestHeartbeat:
+    async def test_pings_live_and_reaps_idle(self):
+        mgr = ConnectionManager(idle_timeout=30)
+        alive, idle = FakeSocket(), FakeSocket()
+        await mgr.connect(alive, "ROOM")
+        await mgr.connect(idle, "ROOM")
+        start = mgr.active_connections["ROOM"][idle].last_seen
+
+        mgr.touch(alive, "ROOM")
+        mgr.active_connections["ROOM"][alive].last_seen = start + 20
+        assert mgr.heartbeat(now=start + 40) == 1
+        await _settle()
+
+        assert idle.closed_with == CLOSE_IDLE
+        assert alive.sent == [{"type": "ping"}]
+        assert list(mgr.active_connections["ROOM"]) == [alive]
+        assert mgr.stats()["rooms"]["ROOM"]["reaped"] == 1
+        await mgr.close_all()
+
@@ -579,10 +579,21 @@ function _mapForApi() {
     }));
 }
 
+// Save over the open WebSocket; fall back to HTTP when the socket is down or
+// no ack arrives (re-sending is safe: shots are keyed by shot number)
+async function _saveShots(list, sid) {
+    try {
+        return await wsClient.submitShots(list, sid);
+    } catch (err) {
+        if (err.status) throw err;   // refused by the server — HTTP would say the same
+        return api.saveResults(currentCode, list, sid);
+    }
+}
+
 async function _autoSave() {
     if (!currentParticipant || !results.length) return;
     const sid = Storage.getLaneSession(currentLane);
-    try { await api.saveResults(currentCode, _mapForApi(), sid); }
+    try { await _saveShots(_mapForApi(), sid); }
     catch (err) { console.error('Auto-save failed:', err); }
 }
 
@@ -601,9 +612,8 @@ async function backToParticipants() {
     const sid = Storage.getLaneSession(currentLane);
     try {
         if (results.length) {
-            await api.saveResults(currentCode, _mapForApi(), sid);
-            const total = results.reduce((a, r) => a + r.score, 0);
-            wsClient.send({ type: 'result_update', participant_id: currentParticipant.id, total_score: total });
+            // The server pushes the leaderboard delta to the room itself
+            await _saveShots(_mapForApi(), sid);
         }
         if (currentParticipant) {
             try {
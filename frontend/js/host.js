@@ -124,10 +124,13 @@ function _connectWS() {
     if (wsClient) wsClient.disconnect();
     wsClient = new WSClient(currentCode);
     wsClient.connect();
-    wsClient.on('result_update', () => {
+    const onResults = () => {
         loadParticipants();
         if (document.getElementById('tab-results').classList.contains('active')) loadResults();
-    });
+    };
+    wsClient.on('leaderboard_delta', onResults);   // pushed by the server after every save
+    wsClient.on('data_changed',      onResults);
+    wsClient.on('result_update',     onResults);   // older lane clients
     wsClient.on('refresh', () => loadParticipants());
 }
 
@@ -588,7 +591,6 @@ function renderResults(grouped) {
     let html = '';
 
     for (const [groupKey, entries] of Object.entries(grouped)) {
-        const sorted = [...entries].sort((a, b) => b.total_score - a.total_score);
         const distHeaders = distOrder.map(d => `<th class="th-dist">${escHtml(d.title)}</th>`).join('');
         html += `
         <div class="results-group">
@@ -604,7 +606,7 @@ function renderResults(grouped) {
                     <th style="width:100px;">X / 10</th>
                 </tr></thead>
                 <tbody>
-                ${sorted.map((entry, i) => {
+                ${entries.map(entry => {
                     const distCells = distOrder.map(d => {
                         const ds = (entry.distance_scores || []).find(s => s.distance_id === d.id);
                         if (ds && ds.score !== null) {
@@ -615,7 +617,7 @@ function renderResults(grouped) {
                     const avg = entry.avg_score > 0 ? entry.avg_score.toFixed(2) : '—';
                     return `
                     <tr>
-                        <td><span class="result-rank rank-${i+1}">${i+1}</span></td>
+                        <td><span class="result-rank rank-${entry.rank}">${entry.rank}</span></td>
                         <td><strong>${escHtml(entry.name)}</strong></td>
                         <td>${entry.lane_shift}</td>
                         ${distCells}
@@ -747,12 +749,11 @@ async function exportCSV() {
 
         // Flatten leaderboard into lookup map by participant id
         const scoreMap = {};   // id -> leaderboard entry
-        const rankMap  = {};   // id -> rank within group (1-based)
+        const rankMap  = {};   // id -> rank within group (1-based, from server)
         for (const entries of Object.values(leaderboard || {})) {
-            const sorted = [...entries].sort((a, b) => b.total_score - a.total_score);
-            sorted.forEach((e, i) => {
+            entries.forEach(e => {
                 scoreMap[e.id] = e;
-                rankMap[e.id]  = i + 1;
+                rankMap[e.id]  = e.rank;
             });
         }
 
@@ -1,8 +1,10 @@
-// VIEWER — polling only (no WebSocket), refreshes every 2 minutes
+// VIEWER — live via WebSocket: server-pushed leaderboard deltas, full reload on other changes
 'use strict';
 
 let currentCode     = null;
-let refreshInterval = null;
+let wsClient        = null;
+let currentBoard    = null;   // last rendered leaderboard (grouped, rank order)
+let boardVersion    = null;   // data version of currentBoard, tracked from WS messages
 let scrollInterval  = null;
 let eventObj        = null;
 let distancesInfo   = [];
@@ -86,17 +88,50 @@ async function _enterViewer(code, sessionId) {
     document.getElementById('results-screen').classList.remove('hidden');
 
     await _loadAndRender();
-    refreshInterval = setInterval(() => _loadAndRender(), 2 * 60 * 1000);
+    _connectWS();
     startAutoScroll();
 }
 
+function _connectWS() {
+    if (wsClient) wsClient.disconnect();
+    wsClient = new WSClient(currentCode);
+    wsClient.maxReconnectAttempts = Infinity;   // unattended big screen
+    wsClient.on('open',              ()  => _loadAndRender());   // resync after (re)connect
+    wsClient.on('leaderboard_delta', msg => _applyDelta(msg));
+    wsClient.on('data_changed',      msg => { boardVersion = msg.version; _loadAndRender(); });
+    wsClient.connect();
+}
+
+// Apply a server-pushed delta; anything unexpected (gap in versions, roster
+// still showing) falls back to a full reload.
+function _applyDelta(msg) {
+    const inSequence = boardVersion !== null && msg.version === boardVersion + 1;
+    boardVersion = msg.version;
+    if (!currentBoard || !inSequence || eventObj?.status === 'created') {
+        _loadAndRender();
+        return;
+    }
+    for (const [groupKey, d] of Object.entries(msg.groups)) {
+        const byId = new Map((currentBoard[groupKey] || []).map(e => [e.id, e]));
+        d.removed.forEach(id => byId.delete(id));
+        d.ranks.forEach(({ id, rank }) => { const e = byId.get(id); if (e) e.rank = rank; });
+        d.entries.forEach(e => byId.set(e.id, e));
+        const entries = [...byId.values()].sort((a, b) => a.rank - b.rank || a.id - b.id);
+        if (entries.length) currentBoard[groupKey] = entries;
+        else delete currentBoard[groupKey];
+    }
+    renderLeaderboard(currentBoard);
+}
+
 function exitViewer(silent = false) {
     if (!silent && !confirm('Exit viewer?')) return;
-    if (refreshInterval) clearInterval(refreshInterval);
+    if (wsClient)       { wsClient.disconnect(); wsClient = null; }
     if (scrollInterval)  clearInterval(scrollInterval);
     Storage.clearEventCode('viewer');
     Storage.clearViewerSession();
-    currentCode = null;
+    currentCode  = null;
+    currentBoard = null;
+    boardVersion = null;
     document.getElementById('results-screen').classList.add('hidden');
     document.getElementById('viewer-pw-screen').classList.add('hidden');
     document.getElementById('code-screen').classList.remove('hidden');
@@ -116,12 +151,13 @@ async function _loadAndRender() {
             renderParticipantRoster(participants);
         } else {
             // Competition running or finished: show ranked leaderboard
-            const leaderboard = await api.getLeaderboard(currentCode);
-            renderLeaderboard(leaderboard);
+            currentBoard = await api.getLeaderboard(currentCode);
+            renderLeaderboard(currentBoard);
         }
     } catch (err) {
         console.error('Viewer error:', err);
-        setTimeout(() => _loadAndRender(), 15000);
+        // Retry only while the board is unusable; live updates resume afterwards
+        setTimeout(() => { if (currentCode) _loadAndRender(); }, 15000);
     }
 }
 
@@ -209,8 +245,7 @@ function renderLeaderboard(grouped) {
         .sort(([a], [b]) => a.localeCompare(b))
         .forEach(([groupKey, entries]) => {
             if (!entries?.length) return;
-            const sorted = [...entries].sort((a, b) => b.total_score - a.total_score);
-
+            // Server sends each group in rank order (total, X, tens)
             const groupDiv = document.createElement('div');
             groupDiv.className = 'leaderboard-group';
 
@@ -219,10 +254,10 @@ function renderLeaderboard(grouped) {
             titleEl.textContent = _formatGroupTitle(groupKey.split('_'));
             groupDiv.appendChild(titleEl);
 
-            sorted.forEach((entry, index) => {
+            entries.forEach(entry => {
                 const row = document.createElement('div');
                 row.className = 'leaderboard-row';
-                if (showRank && index < 3) row.classList.add('top-3');
+                if (showRank && entry.rank <= 3) row.classList.add('top-3');
 
                 let distHtml = '';
                 if (hasMulti) {
@@ -245,7 +280,7 @@ function renderLeaderboard(grouped) {
                 }
 
                 row.innerHTML = `
-                    <span class="lb-rank">${showRank ? index + 1 : ''}</span>
+                    <span class="lb-rank">${showRank ? entry.rank : ''}</span>
                     <span class="lb-lane">${entry.lane_shift}</span>
                     <span class="lb-name">${_esc(entry.name)}${distHtml}</span>
                     <span class="lb-xten"><span class="x-count">X${entry.x_count}</span><span class="ten-count"> 10·${entry.ten_count}</span></span>
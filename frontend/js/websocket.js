@@ -7,6 +7,8 @@ class WSClient {
         this.listeners = {};
         this.reconnectAttempts = 0;
         this.maxReconnectAttempts = 10;
+        this._pendingAcks = {};   // batch_id -> callback for submit_shots acks
+        this._batchSeq = 0;
     }
 
     connect() {
@@ -18,10 +20,14 @@ class WSClient {
             this.ws.onopen = () => {
                 console.log('WebSocket connected');
                 this.reconnectAttempts = 0;
+                // Synthetic event so pages can resync after (re)connecting
+                this.handleMessage({ type: 'open' });
             };
 
             this.ws.onmessage = (event) => {
                 const data = JSON.parse(event.data);
+                // Server heartbeat: answer so the connection is not reaped as idle
+                if (data.type === 'ping') { this.send({ type: 'pong' }); return; }
                 this.handleMessage(data);
             };
 
@@ -45,6 +51,10 @@ class WSClient {
 
     handleMessage(data) {
         const type = data.type;
+        if (type === 'shots_ack' && this._pendingAcks[data.batch_id]) {
+            this._pendingAcks[data.batch_id](data);
+            return;
+        }
         if (this.listeners[type]) {
             this.listeners[type].forEach(callback => callback(data));
         }
@@ -65,6 +75,30 @@ class WSClient {
         }
     }
 
+    // Save shots over the socket (same rules as POST /results). Resolves with
+    // the server ack; rejects with err.status set when the server refused the
+    // batch, or without it when the socket is down / no ack arrived in time.
+    submitShots(results, sessionId, timeoutMs = 5000) {
+        return new Promise((resolve, reject) => {
+            if (!this.ws || this.ws.readyState !== WebSocket.OPEN) {
+                reject(new Error('WebSocket not connected'));
+                return;
+            }
+            const batchId = `${Date.now()}-${++this._batchSeq}`;
+            const timer = setTimeout(() => {
+                delete this._pendingAcks[batchId];
+                reject(new Error('No acknowledgement'));
+            }, timeoutMs);
+            this._pendingAcks[batchId] = ack => {
+                clearTimeout(timer);
+                delete this._pendingAcks[batchId];
+                if (ack.ok) resolve(ack);
+                else reject(Object.assign(new Error(ack.detail || 'Rejected'), { status: ack.status }));
+            };
+            this.send({ type: 'submit_shots', batch_id: batchId, session_id: sessionId, results });
+        });
+    }
+
     disconnect() {
         if (this.ws) {
             this.reconnectAttempts = this.maxReconnectAttempts; // Prevent reconnection